@@ -0,0 +1,57 @@
+"""
+Compare two benchmark reports written by ``benchmarks.run``.
+
+    python -m benchmarks.compare baseline.json candidate.json
+
+Prints each stage's p50 and p90 latency in both reports and the relative
+change, followed by throughput and peak memory.
+"""
+import argparse
+import json
+
+
+def _change(before, after):
+    if not before:
+        return ''
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def compare(baseline, candidate):
+    lines = [f"{'stage':<24}{'p50 before':>12}{'p50 after':>12}{'change':>9}{'p90 before':>12}{'p90 after':>12}{'change':>9}"]
+    for stage in sorted(set(baseline['stages']) | set(candidate['stages'])):
+        before = baseline['stages'].get(stage)
+        after = candidate['stages'].get(stage)
+        if before is None or after is None:
+            lines.append(f"{stage:<24}{'only in ' + ('candidate' if before is None else 'baseline'):>66}")
+            continue
+        lines.append(
+            f"{stage:<24}{before['p50_ms']:>12.2f}{after['p50_ms']:>12.2f}{_change(before['p50_ms'], after['p50_ms']):>9}"
+            f"{before['p90_ms']:>12.2f}{after['p90_ms']:>12.2f}{_change(before['p90_ms'], after['p90_ms']):>9}"
+        )
+
+    before, after = baseline['throughput']['resumes_per_sec'], candidate['throughput']['resumes_per_sec']
+    lines.append(f"\nthroughput: {before:.2f} -> {after:.2f} resumes/sec ({_change(before, after)})")
+    before, after = baseline['memory']['peak_rss_mb'], candidate['memory']['peak_rss_mb']
+    lines.append(f"peak RSS: {before:.0f} -> {after:.0f} MB ({_change(before, after)})")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports.")
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    for report, path in ((baseline, args.baseline), (candidate, args.candidate)):
+        meta = report['meta']
+        print(f"{path}: {meta['git_revision'] or 'unknown revision'}, {meta['resumes']} resumes, seed {meta['seed']}")
+    print()
+    print(compare(baseline, candidate))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""
+Benchmark the upload-to-score path.
+
+Each synthetic resume goes through what ``upload_resume`` triggers: the file
+is queued with ``submit_analysis_job`` and processed with
+``jobs.process_job``. That covers GridFS streaming, text extraction, each
+ATS stage, the model calls and the MongoDB writes, with mongomock standing
+in for MongoDB. Every stage timed by ``resume_analyzer.metrics`` is
+collected per resume.
+
+    python -m benchmarks.run --resumes 100 --output bench.json
+    python -m benchmarks.compare old.json bench.json
+
+The JSON report holds per-stage latency percentiles in milliseconds,
+end-to-end throughput, peak memory and enough metadata (git revision,
+arguments, seed) to tell two runs apart.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    values = np.asarray(samples, dtype=np.float64) * 1000
+    summary = {'count': len(values), 'mean_ms': float(values.mean()), 'max_ms': float(values.max())}
+    for percentile in PERCENTILES:
+        summary[f'p{percentile}_ms'] = float(np.percentile(values, percentile))
+    return summary
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run(args):
+    from bson.objectid import ObjectId
+    from django.conf import settings
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    from benchmarks.synthetic import generate_corpus
+    from resume_analyzer import jobs
+    from resume_analyzer.engine import get_engine_pool
+    from resume_analyzer.metrics import capture_stages, timed
+
+    db = settings.DB
+    job_description_id = db.job_descriptions.insert_one({
+        'title': 'Senior Python Engineer',
+        'content': (
+            "We are looking for a senior backend engineer with strong Python and Django experience, "
+            "REST API design, PostgreSQL or MongoDB, Docker, Kubernetes and AWS. Experience with "
+            "Kafka, CI/CD and mentoring other engineers is a plus."
+        ),
+        'created_at': datetime.datetime.now(),
+    }).inserted_id
+
+    print(f"Generating {args.warmup} + {args.resumes} synthetic resumes (seed {args.seed})...", file=sys.stderr)
+    corpus = generate_corpus(args.warmup + args.resumes, seed=args.seed)
+
+    started = time.perf_counter()
+    get_engine_pool().preload()
+    model_load_seconds = time.perf_counter() - started
+
+    def analyze(filename, file_bytes):
+        with capture_stages() as samples:
+            started = time.perf_counter()
+            with timed('submit'):
+                job_id = jobs.submit_analysis_job(SimpleUploadedFile(filename, file_bytes), job_description_id)
+            job = jobs._claim(ObjectId(job_id))
+            jobs.process_job(job)
+            samples.append(('end_to_end', time.perf_counter() - started))
+        status = jobs.get_job_status(job['_id'])
+        if status['status'] != jobs.COMPLETED:
+            raise RuntimeError(f"{filename}: analysis {status['status']}: {status['error']}")
+        return samples
+
+    # Warm-up runs load lazily initialized state (JD features, tokenizers) and are not reported
+    for filename, file_bytes in corpus[:args.warmup]:
+        analyze(filename, file_bytes)
+
+    if args.trace_memory:
+        tracemalloc.start()
+
+    stages = {}
+    started = time.perf_counter()
+    for i, (filename, file_bytes) in enumerate(corpus[args.warmup:], start=1):
+        for stage, seconds in analyze(filename, file_bytes):
+            stages.setdefault(stage, []).append(seconds)
+        if i % 10 == 0:
+            print(f"{i}/{args.resumes} resumes", file=sys.stderr)
+    elapsed = time.perf_counter() - started
+
+    memory = {'peak_rss_mb': _peak_rss_mb()}
+    if args.trace_memory:
+        memory['python_peak_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+
+    measured = corpus[args.warmup:]
+    return {
+        'meta': {
+            'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'git_revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'resumes': args.resumes,
+            'warmup': args.warmup,
+            'seed': args.seed,
+            'pdf_resumes': sum(filename.endswith('.pdf') for filename, _ in measured),
+            'corpus_bytes': sum(len(file_bytes) for _, file_bytes in measured),
+        },
+        'model_load_seconds': model_load_seconds,
+        'throughput': {
+            'resumes_per_sec': args.resumes / elapsed,
+            'elapsed_seconds': elapsed,
+        },
+        'memory': memory,
+        'stages': {stage: summarize(samples) for stage, samples in sorted(stages.items())},
+    }
+
+
+def print_summary(report, stream=sys.stderr):
+    print(f"\n{'stage':<24}{'count':>7}{'p50 ms':>11}{'p90 ms':>11}{'p99 ms':>11}{'max ms':>11}", file=stream)
+    for stage, summary in report['stages'].items():
+        print(
+            f"{stage:<24}{summary['count']:>7}{summary['p50_ms']:>11.2f}{summary['p90_ms']:>11.2f}"
+            f"{summary['p99_ms']:>11.2f}{summary['max_ms']:>11.2f}",
+            file=stream,
+        )
+    print(f"\nthroughput: {report['throughput']['resumes_per_sec']:.2f} resumes/sec", file=stream)
+    print(f"peak RSS: {report['memory']['peak_rss_mb']:.0f} MB", file=stream)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--resumes', type=int, default=50, help="Resumes to measure.")
+    parser.add_argument('--warmup', type=int, default=3, help="Unmeasured resumes run first.")
+    parser.add_argument('--seed', type=int, default=0, help="Synthetic corpus seed.")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="Also report peak Python heap via tracemalloc (slower).")
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout.")
+    args = parser.parse_args(argv)
+
+    # Never the project settings: a benchmark must not write to the real database
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+    import django
+    django.setup()
+
+    report = run(args)
+    print_summary(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}", file=sys.stderr)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
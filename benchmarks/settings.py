@@ -0,0 +1,33 @@
+"""
+Django settings for the benchmarks: the project settings with MongoDB
+replaced by an in-process mongomock client, so no run touches Atlas and
+every run starts from an empty database.
+"""
+import atexit
+import shutil
+import tempfile
+
+import mongomock
+import mongomock.gridfs
+import pymongo
+
+# Every client the app creates (resume_analyzer.mongo) is this one
+_client = mongomock.MongoClient()
+pymongo.MongoClient = lambda *args, **kwargs: _client
+mongomock.gridfs.enable_gridfs_integration()
+
+from ATS.settings import *  # noqa: E402,F401,F403
+
+DB = _client[MONGO_DB_NAME]  # noqa: F405
+
+# Jobs are processed inline by the benchmark, not by background threads
+ATS_JOB_WORKERS = 0
+ATS_ENGINE_PRELOAD = False
+ATS_ENGINE_POOL_SIZE = 1
+
+# A saved index from an earlier run would outlive its database
+_index_dir = tempfile.mkdtemp(prefix="ats-benchmark-")
+atexit.register(shutil.rmtree, _index_dir, ignore_errors=True)
+ATS_ANN_INDEX_PATH = f"{_index_dir}/index.npz"
+
+LOGGING = {"version": 1, "disable_existing_loggers": False}
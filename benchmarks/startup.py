@@ -0,0 +1,128 @@
+"""
+Measure the import cost of starting a web process.
+
+A fresh interpreter run with ``python -X importtime`` sets up Django with
+the project settings and imports the URLconf, and with it every view
+module, the way the first request to a new replica does. Background job
+workers and engine preloading are switched off, so only imports are
+measured.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --budget 1.0 --output startup.json
+
+The report lists the wall time, the cost of each top-level package and the
+most expensive individual modules. It fails when the wall time exceeds
+``--budget`` seconds, or when a module that should only load on first use
+(the NLP stack, PyMuPDF) was imported at startup.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+# Loaded by the engine pool and text extraction on first use, never at startup
+DEFERRED_MODULES = ('simple_ats', 'sentence_transformers', 'transformers', 'torch', 'spacy', 'fitz', 'pymupdf')
+
+STARTUP_SCRIPT = """
+import time
+started = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(time.perf_counter() - started)
+"""
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)$')
+
+
+def measure(settings_module='ATS.settings'):
+    """Run the startup script in a fresh interpreter; returns (wall seconds, modules)."""
+    env = dict(
+        os.environ,
+        DJANGO_SETTINGS_MODULE=settings_module,
+        ATS_JOB_WORKERS='0',
+        ATS_ENGINE_PRELOAD='0',
+    )
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT],
+        capture_output=True, text=True, env=env, check=False,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Startup script failed:\n{completed.stderr[-4000:]}")
+
+    modules = []
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append({
+                'module': name,
+                'self_ms': int(self_us) / 1000,
+                'cumulative_ms': int(cumulative_us) / 1000,
+                'depth': len(indent) // 2,
+            })
+    return float(completed.stdout.strip().splitlines()[-1]), modules
+
+
+def build_report(wall_seconds, modules, top=25):
+    packages = {}
+    for module in modules:
+        package = module['module'].split('.')[0]
+        packages[package] = packages.get(package, 0.0) + module['self_ms']
+    deferred = sorted({
+        module['module'] for module in modules
+        if module['module'].split('.')[0] in DEFERRED_MODULES
+    })
+    return {
+        'wall_seconds': wall_seconds,
+        'import_ms': sum(module['self_ms'] for module in modules),
+        'module_count': len(modules),
+        'packages': dict(sorted(packages.items(), key=lambda item: -item[1])[:top]),
+        'modules': sorted(modules, key=lambda module: -module['self_ms'])[:top],
+        'deferred_modules_loaded': deferred,
+    }
+
+
+def print_summary(report, stream=sys.stderr):
+    print(f"\n{'package':<32}{'self ms':>10}", file=stream)
+    for package, self_ms in report['packages'].items():
+        print(f"{package:<32}{self_ms:>10.1f}", file=stream)
+    print(f"\n{'module':<48}{'self ms':>10}{'cumul ms':>10}", file=stream)
+    for module in report['modules']:
+        print(f"{module['module']:<48}{module['self_ms']:>10.1f}{module['cumulative_ms']:>10.1f}", file=stream)
+    print(
+        f"\nstartup: {report['wall_seconds']:.3f}s wall, {report['import_ms']:.0f} ms importing "
+        f"{report['module_count']} modules",
+        file=stream,
+    )
+    if report['deferred_modules_loaded']:
+        print(f"loaded at startup: {', '.join(report['deferred_modules_loaded'])}", file=stream)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--settings', default='ATS.settings', help="Django settings module to start with.")
+    parser.add_argument('--top', type=int, default=25, help="Packages and modules to list.")
+    parser.add_argument('--budget', type=float, default=1.0, help="Maximum startup wall time in seconds.")
+    parser.add_argument('--output', help="Also write the JSON report here.")
+    args = parser.parse_args(argv)
+
+    report = build_report(*measure(args.settings), top=args.top)
+    report['budget_seconds'] = args.budget
+    print_summary(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}", file=sys.stderr)
+
+    if report['wall_seconds'] > args.budget or report['deferred_modules_loaded']:
+        print("Startup check failed.", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Deterministic synthetic resumes for the benchmarks.
+
+``generate_corpus(count, seed)`` returns ``(filename, file_bytes)`` pairs in
+a fixed mix of formats (plain text and PDF) and sizes, from a resume of
+about one page to one long enough to take the page-parallel PDF extraction
+path. The same seed always yields byte-identical files.
+"""
+import random
+
+import fitz  # PyMuPDF
+
+SKILLS = [
+    'Python', 'Django', 'Flask', 'FastAPI', 'JavaScript', 'TypeScript', 'React', 'Node.js', 'Java',
+    'Spring', 'Go', 'Rust', 'C++', 'SQL', 'PostgreSQL', 'MongoDB', 'Redis', 'Kafka', 'Docker',
+    'Kubernetes', 'AWS', 'GCP', 'Azure', 'Terraform', 'CI/CD', 'Git', 'Linux', 'REST', 'GraphQL',
+    'Machine Learning', 'PyTorch', 'TensorFlow', 'Pandas', 'NumPy', 'Spark', 'Airflow',
+]
+TITLES = ['Software Engineer', 'Backend Developer', 'Data Engineer', 'Full Stack Developer',
+          'Machine Learning Engineer', 'DevOps Engineer', 'Site Reliability Engineer']
+COMPANIES = ['Acme Corp', 'Globex', 'Initech', 'Umbrella', 'Hooli', 'Stark Industries', 'Wayne Enterprises']
+ACTIONS = ['Designed', 'Built', 'Maintained', 'Migrated', 'Optimized', 'Led the development of', 'Automated']
+OBJECTS = ['a payments API', 'the data pipeline', 'an internal analytics dashboard', 'the search service',
+           'a recommendation engine', 'the deployment tooling', 'a customer onboarding flow']
+
+# name -> (pages, share of the corpus)
+SIZES = {
+    'small': (1, 0.5),
+    'medium': (3, 0.3),
+    'large': (8, 0.15),
+    'xlarge': (24, 0.05),
+}
+
+# Roughly what fits on one PDF page at the font size used below
+CHARS_PER_PAGE = 3000
+
+
+def _bullet(rng):
+    skills = ', '.join(rng.sample(SKILLS, 3))
+    return f"- {rng.choice(ACTIONS)} {rng.choice(OBJECTS)} using {skills}, improving latency by {rng.randint(10, 80)}%."
+
+
+def resume_text(rng, pages):
+    """A resume of about ``pages`` pages with experience and skills sections."""
+    lines = [
+        f"Candidate {rng.randint(1000, 9999)}",
+        f"{rng.choice(TITLES)} with {rng.randint(1, 15)} years of experience.",
+        "",
+        "Experience",
+    ]
+    target = pages * CHARS_PER_PAGE
+    year = 2024
+    while sum(len(line) + 1 for line in lines) < target:
+        start = year - rng.randint(1, 4)
+        lines.append(f"{rng.choice(TITLES)} at {rng.choice(COMPANIES)} ({start} - {year})")
+        lines.extend(_bullet(rng) for _ in range(rng.randint(3, 6)))
+        lines.append("")
+        year = start
+    lines.append("Skills")
+    lines.append(', '.join(rng.sample(SKILLS, rng.randint(6, 15))))
+    return "\n".join(lines)
+
+
+def render_pdf(text):
+    """``text`` laid out over as many PDF pages as it needs."""
+    document = fitz.open()
+    lines = text.split("\n")
+    per_page = 60
+    for start in range(0, len(lines), per_page):
+        page = document.new_page()
+        page.insert_textbox(page.rect + (50, 50, -50, -50), "\n".join(lines[start:start + per_page]), fontsize=9)
+    try:
+        return document.tobytes()
+    finally:
+        document.close()
+
+
+def generate_corpus(count, seed=0):
+    """``count`` ``(filename, file_bytes)`` pairs, alternating text and PDF."""
+    rng = random.Random(seed)
+    names = list(SIZES)
+    weights = [SIZES[name][1] for name in names]
+    corpus = []
+    for i in range(count):
+        size = rng.choices(names, weights)[0]
+        text = resume_text(rng, SIZES[size][0])
+        if i % 2:
+            corpus.append((f"resume-{i:04d}-{size}.pdf", render_pdf(text)))
+        else:
+            corpus.append((f"resume-{i:04d}-{size}.txt", text.encode('utf-8')))
+    return corpus
@@ -0,0 +1,391 @@
+"""
+Admission control for the resume upload endpoints.
+
+``upload_resume`` and ``bulk_upload_resumes`` are marked with
+``admission_controlled``. ``AdmissionMiddleware``, which comes before
+``CsrfViewMiddleware``, runs these checks on their POST requests, in this
+order, before anything reads the body:
+
+- Size. A request without a valid ``Content-Length`` (a chunked upload)
+  gets 411, as its size can't be checked before reading it. A
+  ``Content-Length`` over the endpoint's limit gets 413.
+- Rate. Each client (its IP address, see ``ATS_CLIENT_IP_HEADER``) may
+  spend ``ATS_UPLOAD_RATE_LIMIT`` units per ``ATS_UPLOAD_RATE_WINDOW``
+  seconds. Otherwise it gets 429.
+- Backlog. Uploads get 503 while more than ``ATS_ADMISSION_MAX_BACKLOG``
+  analysis jobs are waiting for a worker.
+- Concurrency. At most ``ATS_ADMISSION_MAX_CONCURRENT`` units of upload
+  requests run at once in a process. Up to ``ATS_ADMISSION_MAX_WAITING``
+  requests wait, each for at most ``ATS_ADMISSION_WAIT_TIMEOUT`` seconds.
+  A request that finds the wait queue full, or times out in it, gets 503.
+
+Analysis itself runs on the job workers (see ``jobs``). Their thread count
+bounds the CPU-bound work, and the backlog check sheds uploads once they
+fall behind. The concurrency slots bound only what an upload request does
+in the web process: receiving the body and copying it into GridFS.
+
+A request costs one unit, plus one for every ``ATS_ADMISSION_UNIT_BYTES``
+of body. A large bulk upload therefore takes several concurrency slots and
+uses up more of the client's rate budget than a single resume. 429 and 503
+responses carry ``Retry-After``. For a full queue it is estimated from
+recent request durations.
+
+Rate counters live in the Django cache. They are shared across processes
+when the cache is. In-flight and waiting counts, and rejections by reason,
+are per process. They are served on ``/metrics`` and as JSON at
+``/admission/stats/``.
+"""
+import logging
+import math
+import os
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.shortcuts import render
+
+from .metrics import Histogram, register
+
+logger = logging.getLogger(__name__)
+
+# Rejection reasons and the status code each one gets
+LENGTH_REQUIRED = 'length_required'
+TOO_LARGE = 'too_large'
+RATE_LIMITED = 'rate_limited'
+BACKLOG = 'backlog'
+QUEUE_FULL = 'queue_full'
+QUEUE_TIMEOUT = 'queue_timeout'
+
+STATUS_CODES = {
+    LENGTH_REQUIRED: 411,
+    TOO_LARGE: 413,
+    RATE_LIMITED: 429,
+    BACKLOG: 503,
+    QUEUE_FULL: 503,
+    QUEUE_TIMEOUT: 503,
+}
+
+MESSAGES = {
+    LENGTH_REQUIRED: "Uploads must declare their size in a Content-Length header.",
+    TOO_LARGE: "The upload is too large.",
+    RATE_LIMITED: "Too many uploads from your address. Please wait before uploading again.",
+    BACKLOG: "Too many resumes are waiting for analysis. Please try again shortly.",
+    QUEUE_FULL: "The server is busy analyzing other uploads. Please try again shortly.",
+    QUEUE_TIMEOUT: "The server is busy analyzing other uploads. Please try again shortly.",
+}
+
+# Weight of the latest request duration in the running average behind Retry-After
+DURATION_SMOOTHING = 0.2
+
+# Form fields and multipart boundaries sent along with the files
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+# Seconds a queued-job count is reused before counting again
+BACKLOG_CHECK_INTERVAL = 1.0
+
+WAIT_DURATION = register(Histogram(
+    'ats_admission_wait_seconds',
+    'Time admitted upload requests waited for a free slot.',
+    'endpoint',
+))
+
+
+class Rejected(Exception):
+    """A request turned away by admission control."""
+
+    def __init__(self, reason, retry_after=None):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    A weighted semaphore with a bounded, timed wait queue, plus the
+    per-process rejection counts.
+    """
+
+    def __init__(self, capacity, max_waiting, timeout):
+        self.capacity = capacity
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self._condition = threading.Condition()
+        self._in_use = 0
+        self._waiting = 0
+        self._admitted = {}
+        self._rejected = {}
+        self._avg_seconds = None
+        self._backlog = None
+        self._backlog_checked_at = None
+
+    def _retry_after(self, units):
+        # Time for the slots ahead of this request to drain at the recent pace
+        avg_seconds = self._avg_seconds or 1.0
+        ahead = self._in_use + self._waiting + units
+        return max(1, math.ceil(avg_seconds * ahead / self.capacity))
+
+    def acquire(self, endpoint, units=1):
+        """
+        Take ``units`` slots, waiting up to the timeout behind a bounded
+        queue. Raises ``Rejected`` when the queue is full or the wait times
+        out.
+        """
+        units = min(units, self.capacity)
+        start = time.monotonic()
+        with self._condition:
+            if self._in_use + units > self.capacity:
+                if self._waiting >= self.max_waiting:
+                    raise Rejected(QUEUE_FULL, self._retry_after(units))
+                self._waiting += 1
+                try:
+                    deadline = start + self.timeout
+                    while self._in_use + units > self.capacity:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise Rejected(QUEUE_TIMEOUT, self._retry_after(units))
+                        self._condition.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._in_use += units
+            self._admitted[endpoint] = self._admitted.get(endpoint, 0) + 1
+        WAIT_DURATION.observe(endpoint, time.monotonic() - start)
+        return units
+
+    def release(self, units, seconds):
+        with self._condition:
+            self._in_use -= units
+            if self._avg_seconds is None:
+                self._avg_seconds = seconds
+            else:
+                self._avg_seconds += DURATION_SMOOTHING * (seconds - self._avg_seconds)
+            self._condition.notify_all()
+
+    def reject(self, endpoint, reason):
+        with self._condition:
+            key = (endpoint, reason)
+            self._rejected[key] = self._rejected.get(key, 0) + 1
+
+    def backlog(self, count):
+        """
+        Pending analysis jobs, from ``count()`` at most once per
+        ``BACKLOG_CHECK_INTERVAL``.
+        """
+        now = time.monotonic()
+        if self._backlog_checked_at is None or now - self._backlog_checked_at >= BACKLOG_CHECK_INTERVAL:
+            self._backlog = count()
+            self._backlog_checked_at = now
+        return self._backlog
+
+    def stats(self):
+        """Slots in use, waiting requests and admission counts by endpoint."""
+        with self._condition:
+            return {
+                'capacity': self.capacity,
+                'in_use': self._in_use,
+                'waiting': self._waiting,
+                'max_waiting': self.max_waiting,
+                'wait_timeout': self.timeout,
+                'request_seconds_avg': self._avg_seconds,
+                'job_backlog': self._backlog,
+                'admitted': dict(sorted(self._admitted.items())),
+                'rejected': [
+                    {'endpoint': endpoint, 'reason': reason, 'count': count}
+                    for (endpoint, reason), count in sorted(self._rejected.items())
+                ],
+            }
+
+    def render(self):
+        stats = self.stats()
+        lines = []
+        for name, documentation, value in (
+            ('ats_admission_capacity', 'Upload work units allowed to run at once.', stats['capacity']),
+            ('ats_admission_in_use', 'Upload work units running now.', stats['in_use']),
+            ('ats_admission_waiting', 'Upload requests waiting for a free slot.', stats['waiting']),
+        ):
+            lines.extend([f"# HELP {name} {documentation}", f"# TYPE {name} gauge", f"{name} {value}"])
+        if stats['job_backlog'] is not None:
+            name = 'ats_admission_job_backlog'
+            lines.extend([
+                f"# HELP {name} Analysis jobs waiting for a worker, as last counted by admission control.",
+                f"# TYPE {name} gauge",
+                f"{name} {stats['job_backlog']}",
+            ])
+        name = 'ats_admission_admitted_total'
+        lines.extend([f"# HELP {name} Upload requests admitted.", f"# TYPE {name} counter"])
+        for endpoint, count in stats['admitted'].items():
+            lines.append(f'{name}{{endpoint="{endpoint}"}} {count}')
+        name = 'ats_admission_rejected_total'
+        lines.extend([f"# HELP {name} Upload requests rejected, by reason.", f"# TYPE {name} counter"])
+        for rejection in stats['rejected']:
+            lines.append(
+                f'{name}{{endpoint="{rejection["endpoint"]}",reason="{rejection["reason"]}"}} {rejection["count"]}'
+            )
+        return lines
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller():
+    """Return the process-wide admission controller, creating it on first use."""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                capacity = settings.ATS_ADMISSION_MAX_CONCURRENT or os.cpu_count() or 1
+                _controller = register(AdmissionController(
+                    capacity=capacity,
+                    max_waiting=settings.ATS_ADMISSION_MAX_WAITING or 2 * capacity,
+                    timeout=settings.ATS_ADMISSION_WAIT_TIMEOUT,
+                ))
+    return _controller
+
+
+def client_address(request):
+    """
+    The client's address. Behind a proxy, ``ATS_CLIENT_IP_HEADER`` names the
+    header it sets; of a comma-separated list (X-Forwarded-For) the last
+    entry, added by the proxy itself, is used.
+    """
+    value = request.META.get(settings.ATS_CLIENT_IP_HEADER) or request.META.get('REMOTE_ADDR') or 'unknown'
+    return value.split(',')[-1].strip()
+
+
+def _content_length(request):
+    # None when missing or invalid, e.g. for chunked transfer encoding
+    try:
+        length = int(request.META['CONTENT_LENGTH'])
+    except (KeyError, ValueError):
+        return None
+    return length if length >= 0 else None
+
+
+def request_units(length):
+    """One unit, plus one per ``ATS_ADMISSION_UNIT_BYTES`` of request body."""
+    return 1 + length // settings.ATS_ADMISSION_UNIT_BYTES
+
+
+def check_rate(endpoint, client, units):
+    """
+    Charge ``units`` to the client's budget for the current window (fixed
+    windows in the Django cache). Raises ``Rejected`` once the budget is
+    spent. Rejected attempts are charged too, so retrying early does not help.
+    """
+    limit = settings.ATS_UPLOAD_RATE_LIMIT
+    if not limit:
+        return
+    window = settings.ATS_UPLOAD_RATE_WINDOW
+    now = time.time()
+    bucket = int(now // window)
+    key = f'admission:{endpoint}:{client}:{bucket}'
+    # A request bigger than the whole budget can still go through in an idle window
+    units = min(units, limit)
+    cache.add(key, 0, timeout=window)
+    try:
+        spent = cache.incr(key, units)
+    except ValueError:
+        # The window expired between add() and incr()
+        cache.set(key, units, timeout=window)
+        spent = units
+    if spent > limit:
+        raise Rejected(RATE_LIMITED, max(1, math.ceil((bucket + 1) * window - now)))
+
+
+def check_backlog(controller):
+    """Raises ``Rejected`` while too many analysis jobs are waiting for a worker."""
+    limit = settings.ATS_ADMISSION_MAX_BACKLOG
+    if not limit:
+        return
+    from .jobs import count_pending_jobs
+
+    if controller.backlog(count_pending_jobs) >= limit:
+        raise Rejected(BACKLOG, settings.ATS_ADMISSION_BACKLOG_RETRY_AFTER)
+
+
+def _rejection_response(request, rejected):
+    response = render(request, 'resume_analyzer/error.html', {
+        'error_message': MESSAGES[rejected.reason],
+    }, status=STATUS_CODES[rejected.reason])
+    if rejected.retry_after is not None:
+        response['Retry-After'] = str(rejected.retry_after)
+    return response
+
+
+def admission_controlled(endpoint, max_bytes, backlog=False):
+    """
+    Mark an upload view for admission control; ``AdmissionMiddleware``
+    checks its POST requests. ``max_bytes`` is the name of the setting with
+    the largest accepted body; ``backlog`` turns on the job backlog check.
+    """
+    def decorator(view):
+        view.admission = {'endpoint': endpoint, 'max_bytes': max_bytes, 'backlog': backlog}
+        return view
+    return decorator
+
+
+class AdmissionMiddleware:
+    """
+    Runs the admission checks of views marked with ``admission_controlled``.
+
+    It must come before ``CsrfViewMiddleware``, whose ``process_view`` reads
+    ``request.POST`` and with it the whole multipart body. A rejected request
+    is answered before any of its body is read. An admitted one holds its
+    slots until its response has been produced.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        try:
+            return self.get_response(request)
+        finally:
+            self._release(request)
+
+    async def __acall__(self, request):
+        try:
+            return await self.get_response(request)
+        finally:
+            self._release(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        policy = getattr(view_func, 'admission', None)
+        if policy is None or request.method != 'POST':
+            return None
+
+        endpoint = policy['endpoint']
+        controller = get_admission_controller()
+        length = _content_length(request)
+        units = request_units(length or 0)
+        try:
+            if length is None:
+                raise Rejected(LENGTH_REQUIRED)
+            if length > getattr(settings, policy['max_bytes']) + FORM_OVERHEAD_BYTES:
+                raise Rejected(TOO_LARGE)
+            check_rate(endpoint, client_address(request), units)
+            if policy['backlog']:
+                check_backlog(controller)
+            units = controller.acquire(endpoint, units)
+        except Rejected as e:
+            controller.reject(endpoint, e.reason)
+            logger.warning("Rejected %s request from %s: %s", endpoint, client_address(request), e.reason)
+            return _rejection_response(request, e)
+
+        request._admission = (units, time.monotonic())
+        return None
+
+    @staticmethod
+    def _release(request):
+        admitted = getattr(request, '_admission', None)
+        if admitted is not None:
+            units, start = admitted
+            get_admission_controller().release(units, time.monotonic() - start)
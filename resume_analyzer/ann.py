@@ -0,0 +1,292 @@
+"""
+Approximate nearest-neighbour search over stored resume embeddings.
+
+``SimilarityIndex`` is an inverted-file (IVF) index in plain NumPy. Once
+enough resumes are embedded, a spherical k-means splits them into about
+``sqrt(n)`` clusters. A query is compared to the cluster centroids and only
+the resumes in its ``nprobe`` closest clusters are scored exactly. Until
+then every query is an exact scan.
+
+New embeddings are assigned to their nearest existing centroid as they are
+added, either by the analysis code in this process (``index_resumes``) or
+when a query refreshes from MongoDB. The clusters are retrained only after
+the index has grown fourfold. The whole index is periodically written to
+``ATS_ANN_INDEX_PATH`` so a restarted process loads it and then reads only
+the embeddings added since. A saved index whose vectors don't match the
+stored embeddings' dimension is ignored and rebuilt from MongoDB. Resumes
+deleted from MongoDB are removed from the index when they turn up in search
+results.
+"""
+import atexit
+import datetime
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+from bson.objectid import ObjectId
+from django.conf import settings
+
+from .engine import SENTENCE_MODEL_NAME
+from .ranking import ResumeMatrix, _normalize, load_embedding, top_k
+
+logger = logging.getLogger(__name__)
+
+# Retrain the clusters once the index has grown by this factor
+RETRAIN_GROWTH = 4
+
+# k-means trains on at most this many resumes per cluster
+TRAINING_SAMPLES_PER_LIST = 64
+
+# Rows compared to the centroids per matrix product when assigning
+ASSIGN_CHUNK_ROWS = 8192
+
+
+def _nearest_centroids(vectors, centroids):
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_CHUNK_ROWS):
+        chunk = vectors[start:start + ASSIGN_CHUNK_ROWS]
+        assignments[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+def kmeans(vectors, n_clusters, iterations=10, seed=0):
+    """Spherical k-means over normalized ``vectors``; returns normalized centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _nearest_centroids(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        # Leave clusters that lost all their members where they were
+        empty = np.bincount(assignments, minlength=n_clusters) == 0
+        sums[empty] = centroids[empty]
+        centroids = _normalize(sums)
+    return centroids
+
+
+class SimilarityIndex(ResumeMatrix):
+    """IVF index over the resume matrix, persisted to ``path``."""
+
+    def __init__(self, collection, path=None, nprobe=8, min_train_size=1000, save_interval=300):
+        super().__init__(collection)
+        self.path = path
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.save_interval = save_interval
+        self.centroids = None
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._lists = None
+        self._trained_size = 0
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def add(self, ids, vectors):
+        with self._lock:
+            rows = super().add(ids, vectors)
+            if not len(rows):
+                return rows
+            if self.centroids is None:
+                if len(self.ids) >= self.min_train_size:
+                    self.train()
+            elif len(self.ids) >= RETRAIN_GROWTH * self._trained_size:
+                self.train()
+            else:
+                self._assign(rows)
+            self._dirty = True
+            return rows
+
+    def train(self):
+        """(Re)build the clusters from every loaded embedding."""
+        with self._lock:
+            count = len(self.ids)
+            n_clusters = max(1, int(np.sqrt(count)))
+            sample_size = min(count, n_clusters * TRAINING_SAMPLES_PER_LIST)
+            sample = np.random.default_rng(0).choice(count, sample_size, replace=False)
+            logger.info("Training similarity index: %s clusters over %s resumes", n_clusters, count)
+            self.centroids = kmeans(self.matrix[sample], n_clusters)
+            self._trained_size = count
+            self._assignments = np.empty(0, dtype=np.int32)
+            self._assign(np.arange(count))
+
+    def _assign(self, rows):
+        grown = len(self._assignments) < len(self.ids)
+        if grown:
+            assignments = np.empty(len(self.ids), dtype=np.int32)
+            assignments[:len(self._assignments)] = self._assignments
+            self._assignments = assignments
+        assignments = _nearest_centroids(self._buffer[rows], self.centroids)
+        # The inverted lists hold rows, so they only go stale when a row moves cluster
+        if grown or np.any(self._assignments[rows] != assignments):
+            self._lists = None
+        self._assignments[rows] = assignments
+
+    def remove(self, ids):
+        with self._lock:
+            keep = super().remove(ids)
+            if keep is not None:
+                if self.centroids is not None:
+                    self._assignments = self._assignments[:len(keep)][keep]
+                self._lists = None
+                self._dirty = True
+            return keep
+
+    def _inverted_lists(self):
+        # Rebuilt lazily after additions: one argsort, then a split per cluster
+        if self._lists is None:
+            order = np.argsort(self._assignments, kind='stable')
+            bounds = np.searchsorted(self._assignments[order], np.arange(len(self.centroids) + 1))
+            self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.centroids))]
+        return self._lists
+
+    def refresh(self):
+        with self._lock:
+            super().refresh()
+            if self._dirty and time.monotonic() - self._saved_at >= self.save_interval:
+                self.save()
+
+    def vector_of(self, resume_id):
+        """The stored, normalized embedding of ``resume_id``, or None."""
+        with self._lock:
+            self.refresh()
+            row = self._row_of.get(resume_id)
+            return None if row is None else self._buffer[row].copy()
+
+    def search(self, query_embedding, k, exclude=None):
+        """
+        ``(resume_id, similarity)`` pairs for approximately the ``k`` resumes
+        most similar to ``query_embedding``, best first, leaving out the
+        resume ``exclude``.
+        """
+        with self._lock:
+            self.refresh()
+            query = _normalize(np.asarray(query_embedding, dtype=np.float32).reshape(-1))
+            # Deleted resumes are only noticed when they rank; drop them and search again
+            while True:
+                similar = self._search(query, k, exclude)
+                if not self.drop_deleted([resume_id for resume_id, _ in similar]):
+                    return similar
+
+    def _search(self, query, k, exclude):
+        if not self.ids:
+            return []
+        if self.centroids is None:
+            rows = np.arange(len(self.ids))
+        else:
+            lists = self._inverted_lists()
+            probed = top_k(self.centroids @ query, self.nprobe)
+            rows = np.concatenate([lists[cluster] for cluster in probed])
+
+        excluded_row = self._row_of.get(exclude)
+        if excluded_row is not None:
+            rows = rows[rows != excluded_row]
+
+        scores = self._buffer[rows] @ query
+        return [(self.ids[rows[i]], float(scores[i])) for i in top_k(scores, k)]
+
+    def save(self):
+        """
+        Write the index to ``path`` atomically. Each save writes its own
+        temporary file, so processes saving at once never mix their writes.
+        """
+        with self._lock:
+            if not self.path:
+                return
+            directory = os.path.dirname(self.path) or '.'
+            os.makedirs(directory, exist_ok=True)
+            dims = self._buffer.shape[1]
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.savez(
+                        f,
+                        model=np.array(SENTENCE_MODEL_NAME),
+                        ids=np.array([str(resume_id) for resume_id in self.ids]),
+                        vectors=self.matrix,
+                        centroids=self.centroids if self.centroids is not None else np.empty((0, dims), dtype=np.float32),
+                        assignments=self._assignments[:len(self.ids)],
+                        trained_size=np.array(self._trained_size),
+                        watermark=np.array(self._watermark.isoformat() if self._watermark else ''),
+                    )
+                os.replace(temp_path, self.path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+            self._dirty = False
+            self._saved_at = time.monotonic()
+            logger.info("Saved similarity index of %s resumes to %s", len(self.ids), self.path)
+
+    def load(self):
+        """Load the index saved at ``path``; returns False if there is none usable."""
+        with self._lock:
+            if not self.path or not os.path.exists(self.path):
+                return False
+            try:
+                with np.load(self.path, allow_pickle=False) as saved:
+                    saved = {name: saved[name] for name in saved.files}
+                if str(saved['model']) != SENTENCE_MODEL_NAME:
+                    logger.warning("Ignoring similarity index built with model %s", saved['model'])
+                    return False
+                ids = [ObjectId(resume_id) for resume_id in saved['ids']]
+                watermark = str(saved['watermark'])
+            except Exception as e:
+                logger.warning("Could not load similarity index from %s: %s", self.path, e)
+                return False
+
+            # A stale file (another model version or database) would break every later add
+            dims = saved['vectors'].shape[1]
+            stored = self.collection.find_one(
+                {'embedding': {'$exists': True}, 'embedding_model': SENTENCE_MODEL_NAME}, {'embedding': 1}
+            )
+            if stored is None or len(load_embedding(stored['embedding'])) != dims:
+                logger.warning(
+                    "Ignoring similarity index at %s: its %s-dimensional vectors don't match the stored embeddings",
+                    self.path, dims,
+                )
+                return False
+
+            self.ids = ids
+            self._row_of = {resume_id: row for row, resume_id in enumerate(ids)}
+            self._buffer = np.array(saved['vectors'], dtype=np.float32)
+            self.centroids = np.array(saved['centroids']) if len(saved['centroids']) else None
+            self._assignments = np.array(saved['assignments'], dtype=np.int32)
+            self._trained_size = int(saved['trained_size'])
+            self._watermark = datetime.datetime.fromisoformat(watermark) if watermark else None
+            self._lists = None
+            logger.info("Loaded similarity index of %s resumes from %s", len(self.ids), self.path)
+            return True
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_similarity_index():
+    """Return the process-wide similarity index, loading it from disk on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = SimilarityIndex(
+                    settings.DB.resumes,
+                    path=settings.ATS_ANN_INDEX_PATH,
+                    nprobe=settings.ATS_ANN_NPROBE,
+                    min_train_size=settings.ATS_ANN_MIN_TRAIN_SIZE,
+                    save_interval=settings.ATS_ANN_SAVE_INTERVAL,
+                )
+                index.load()
+                atexit.register(lambda: index._dirty and index.save())
+                _index = index
+    return _index
+
+
+def index_resumes(resume_ids, embeddings):
+    """
+    Add freshly stored resume embeddings to this process's similarity index.
+    A process that has not loaded the index yet skips this; it reads the
+    new embeddings from MongoDB when the index is first used.
+    """
+    if _index is not None and len(resume_ids):
+        _index.add(list(resume_ids), np.asarray(embeddings, dtype=np.float32))
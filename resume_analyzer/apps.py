@@ -1,6 +1,46 @@
+import os
+import sys
+import threading
+
 from django.apps import AppConfig
+from django.conf import settings
+
+
+def _is_serving_process():
+    """
+    True unless we are running a management command other than runserver
+    (migrate, shell, ...) or the runserver autoreloader's parent process.
+    """
+    if os.path.basename(sys.argv[0]) != 'manage.py':
+        return True
+    if sys.argv[1:2] != ['runserver']:
+        return False
+    return os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv
 
 
 class ResumeAnalyzerConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "resume_analyzer"
+
+    def ready(self):
+        if not _is_serving_process():
+            return
+
+        if getattr(settings, 'ATS_JOB_WORKERS', 0) <= 0:
+            # Analysis runs elsewhere; the models load on first use, if ever
+            return
+
+        from .jobs import start_workers
+
+        # Pick up jobs queued before a restart or left behind by other workers
+        start_workers()
+
+        if getattr(settings, 'ATS_ENGINE_PRELOAD', False):
+            from .engine import get_engine_pool
+
+            # Warm the pool in the background so startup isn't blocked on model loading
+            threading.Thread(
+                target=get_engine_pool().preload,
+                name='ats-engine-preload',
+                daemon=True,
+            ).start()
@@ -0,0 +1,116 @@
+"""
+Non-blocking MongoDB access for the async views.
+
+Under an ASGI server, async views use PyMongo's native asyncio client
+(``pymongo.AsyncMongoClient``, the successor to Motor), connected to the
+same deployment and database as ``settings.DB``. An async client belongs to
+the event loop it first runs on. That is the server's single loop, so each
+process shares one client and connection pool. Clients use the same pool
+settings and pool metrics as the sync client (``mongo.client_options``).
+
+A WSGI server (including ``runserver``) runs every async view in a
+short-lived event loop of its own. An async client per loop would mean a
+new connection pool and handshake on every page view. There the views get
+``BlockingDatabase`` instead: the same awaitable interface over the
+process's sync client. The loop serves only the one request, so blocking
+it costs nothing.
+"""
+import asyncio
+import itertools
+import weakref
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from pymongo import AsyncMongoClient
+
+from .mongo import client_options, read_preference
+
+_clients = weakref.WeakKeyDictionary()
+
+
+def is_asgi(request):
+    """Whether ``request`` is being served by an ASGI server."""
+    return isinstance(request, ASGIRequest)
+
+
+def get_sync_db(read_preference_name=None):
+    """``settings.DB``, reading from the primary unless another mode is named."""
+    if read_preference_name is None:
+        return settings.DB
+    return settings.DB.with_options(read_preference=read_preference(read_preference_name))
+
+
+def get_async_db(request, read_preference_name=None):
+    """
+    The ATS database for an async view serving ``request``, reading from the
+    primary unless another ``read_preference_name`` is given.
+    """
+    if not is_asgi(request):
+        return BlockingDatabase(get_sync_db(read_preference_name))
+
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = AsyncMongoClient(settings.MONGO_URI, **client_options('async'))
+    if read_preference_name is None:
+        return client[settings.MONGO_DB_NAME]
+    return client.get_database(settings.MONGO_DB_NAME, read_preference=read_preference(read_preference_name))
+
+
+class BlockingCursor:
+    """A sync PyMongo cursor behind the ``AsyncCursor`` interface."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self._cursor.sort(*args, **kwargs)
+        return self
+
+    async def to_list(self, length=None):
+        return list(itertools.islice(self._cursor, length))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._cursor)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class BlockingCollection:
+    """A sync PyMongo collection behind the ``AsyncCollection`` interface."""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def find(self, *args, **kwargs):
+        return BlockingCursor(self._collection.find(*args, **kwargs))
+
+    async def aggregate(self, *args, **kwargs):
+        return BlockingCursor(self._collection.aggregate(*args, **kwargs))
+
+    def __getattr__(self, name):
+        # find_one, insert_one, update_one, ...
+        method = getattr(self._collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+
+class BlockingDatabase:
+    """A sync PyMongo database behind the ``AsyncDatabase`` interface."""
+
+    def __init__(self, database):
+        self._database = database
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return BlockingCollection(self._database[name])
+
+    def __getitem__(self, name):
+        return BlockingCollection(self._database[name])
@@ -0,0 +1,285 @@
+"""
+Bulk resume upload: unpack the submitted files, extract their text in the
+extraction process pool and score them against one job description in
+batched model calls, storing everything with one bulk write per collection. The view
+only validates the files and streams them into GridFS; ``analyze_uploads``
+runs as a ``bulk`` job on the analysis workers (see ``jobs``), reading each
+file back from GridFS when it is extracted.
+"""
+import datetime
+import hashlib
+import logging
+import os
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+from django.conf import settings
+from pymongo import UpdateOne
+
+from .ann import index_resumes
+from .dedup import content_hash
+from .engine import get_engine_pool
+from .extraction import ExtractionError, check_size, extract_stream, get_extraction_pool
+from .jd_cache import get_jd_feature_cache, jd_content_hash
+from .metrics import apportion, timed
+from .ranking import embedding_fields
+from .skills import as_skill_list
+from .storage import dump_text
+
+logger = logging.getLogger(__name__)
+
+# Same formats the single upload form accepts
+ACCEPTED_EXTENSIONS = ('.pdf', '.txt', '.docx')
+
+
+class BulkUploadError(Exception):
+    """Raised when a bulk upload cannot be accepted as a whole."""
+
+
+def _is_accepted(filename):
+    basename = os.path.basename(filename)
+    if not basename or basename.startswith('.') or '__MACOSX' in filename:
+        return False
+    return os.path.splitext(basename)[1].lower() in ACCEPTED_EXTENSIONS
+
+
+def _check_file_size(filename, size):
+    try:
+        check_size(size)
+    except ExtractionError as e:
+        raise BulkUploadError(f"{os.path.basename(filename)}: {str(e)}")
+
+
+def collect_uploads(files, archive=None):
+    """
+    Yield the uploaded files and the members of an optional zip archive as
+    ``(filename, file)`` pairs, where ``file`` streams the resume's bytes.
+    Nothing is read here; archive members are decompressed as their file is
+    read.
+
+    Unsupported file types are skipped. Limits are checked against the
+    declared sizes before each file is yielded: raises ``BulkUploadError``
+    when the archive is invalid, a file exceeds ``ATS_UPLOAD_MAX_BYTES`` or
+    the upload exceeds ``ATS_BULK_MAX_FILES`` / ``ATS_BULK_MAX_BYTES``.
+    """
+    max_files = getattr(settings, 'ATS_BULK_MAX_FILES', 500)
+    max_bytes = getattr(settings, 'ATS_BULK_MAX_BYTES', 200 * 1024 * 1024)
+
+    count = 0
+    total_bytes = 0
+
+    def check(filename, size):
+        nonlocal count, total_bytes
+        _check_file_size(filename, size)
+        count += 1
+        total_bytes += size
+        if count > max_files:
+            raise BulkUploadError(f"A bulk upload may contain at most {max_files} resumes.")
+        if total_bytes > max_bytes:
+            raise BulkUploadError(f"A bulk upload may contain at most {max_bytes} bytes of resumes.")
+
+    for uploaded_file in files:
+        if _is_accepted(uploaded_file.name):
+            check(uploaded_file.name, uploaded_file.size)
+            uploaded_file.seek(0)
+            yield uploaded_file.name, uploaded_file
+
+    if archive is not None:
+        try:
+            with zipfile.ZipFile(archive) as zip_file:
+                for member in zip_file.infolist():
+                    if member.is_dir() or not _is_accepted(member.filename):
+                        continue
+                    # A member never decompresses past its declared size
+                    check(member.filename, member.file_size)
+                    with zip_file.open(member) as member_file:
+                        yield os.path.basename(member.filename), member_file
+        except zipfile.BadZipFile as e:
+            raise BulkUploadError(f"Invalid zip archive: {str(e)}")
+
+
+class _HashingReader:
+    """Reads ``file`` through, hashing the bytes read."""
+
+    def __init__(self, file):
+        self._file = file
+        self._digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self._file.read(size)
+        self._digest.update(data)
+        return data
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+
+def _extract_or_none(filename, open_file):
+    # One bad document must not fail the batch
+    with closing(open_file()) as file:
+        reader = _HashingReader(file)
+        try:
+            resume_content = extract_stream(filename, reader, parallel=False)
+        except ExtractionError as e:
+            logger.warning("Skipping %s: %s", filename, e)
+            return None, None
+    return resume_content, reader.hexdigest()
+
+
+def extract_texts(uploads):
+    """
+    Extract the text of every ``(filename, open_file)`` pair in parallel,
+    one document per extraction pool worker, and return ``(text,
+    file_hash)`` pairs. ``open_file()`` returns a file to stream the
+    resume from; it is called only when that resume's turn comes, so at most
+    one file per worker is being read at a time. Documents that exceed the
+    extraction limits come back as ``(None, None)``.
+    """
+    if not uploads:
+        return []
+    filenames, openers = zip(*uploads)
+    with ThreadPoolExecutor(max_workers=get_extraction_pool().size) as threads:
+        return list(threads.map(_extract_or_none, filenames, openers))
+
+
+def _upsert_many(collection, keyed_documents):
+    """
+    Insert each ``(key, document)`` unless a document matching ``key``
+    exists, in one ``bulk_write``.
+    """
+    collection.bulk_write([
+        UpdateOne(key, {'$setOnInsert': document}, upsert=True)
+        for key, document in keyed_documents
+    ], ordered=False)
+
+
+def analyze_uploads(db, uploads, job_description):
+    """
+    Extract, score and store a batch of uploads, ``(filename, open_file)``
+    pairs (see ``extract_texts``), against one job description.
+
+    Identical resume text is stored once and resumes already analyzed against
+    this job description's text are not re-scored (see ``dedup``). Everything
+    else is scored in batched model calls on one checked-out ``ATSEngine``.
+
+    Returns ``(results, skipped)``: one row per distinct resume with ``id``
+    (the analysis result), ``filename``, ``similarity_score`` and
+    ``extracted_skills``, and the filenames of uploads whose text could not
+    be extracted within the limits.
+    """
+    selected_jd_id = str(job_description['_id'])
+    jd_hash = jd_content_hash(job_description['content'])
+
+    # Extract in parallel, dropping failures and duplicate texts within the batch
+    resumes = {}
+    skipped = []
+    start = time.perf_counter()
+    texts = extract_texts(uploads)
+    extraction_seconds = time.perf_counter() - start
+    for (filename, _), (resume_content, file_hash) in zip(uploads, texts):
+        if resume_content is None:
+            skipped.append(filename)
+            continue
+        resumes.setdefault(content_hash(resume_content), {
+            'filename': filename,
+            'content': resume_content,
+            'file_hash': file_hash,
+        })
+
+    memoized = {
+        result['resume_hash']: result
+        for result in db.analysis_results.find(
+            {
+                'resume_hash': {'$in': list(resumes)},
+                'jd_hash': jd_hash,
+                'job_description_id': selected_jd_id,
+            },
+            {'resume_hash': 1, 'similarity_score': 1, 'extracted_skills': 1},
+        )
+    }
+    to_score = [resume_hash for resume_hash in resumes if resume_hash not in memoized]
+
+    analyses = []
+    if to_score:
+        timings = [{} for _ in to_score]
+        apportion('extraction', extraction_seconds, timings)
+        batch_size = getattr(settings, 'ATS_BULK_BATCH_SIZE', 32)
+        with get_engine_pool().checkout() as engine:
+            jd_features = get_jd_feature_cache().get_or_compute(
+                job_description['content'], engine.compute_jd_features
+            )
+            analyses = engine.analyze_many(
+                [resumes[resume_hash]['content'] for resume_hash in to_score],
+                jd_features,
+                batch_size=batch_size,
+                timings=timings,
+            )
+
+        now = datetime.datetime.now()
+
+        # Store resumes and results in MongoDB with one round-trip each
+        start = time.perf_counter()
+        resume_ops = []
+        for resume_hash, (_, _, _, resume_embedding) in zip(to_score, analyses):
+            embedding = embedding_fields(resume_embedding)
+            resume_ops.append(UpdateOne({'content_hash': resume_hash}, {'$setOnInsert': {
+                'filename': resumes[resume_hash]['filename'],
+                'content': dump_text(resumes[resume_hash]['content']),
+                'file_hash': resumes[resume_hash]['file_hash'],
+                'job_description_id': selected_jd_id,
+                'uploaded_at': now,
+                **embedding,
+            }}, upsert=True))
+            # A resume stored earlier without an embedding gets this one
+            resume_ops.append(UpdateOne(
+                {'content_hash': resume_hash, 'embedding': {'$exists': False}}, {'$set': embedding}
+            ))
+        db.resumes.bulk_write(resume_ops, ordered=False)
+        apportion('mongo_store_resume', time.perf_counter() - start, timings)
+        resume_ids = {
+            resume['content_hash']: resume['_id']
+            for resume in db.resumes.find({'content_hash': {'$in': to_score}}, {'content_hash': 1})
+        }
+        index_resumes(
+            [resume_ids[resume_hash] for resume_hash in to_score],
+            [resume_embedding for _, _, _, resume_embedding in analyses],
+        )
+
+        with timed('mongo_store_result'):
+            _upsert_many(db.analysis_results, [
+                ({'resume_hash': resume_hash, 'jd_hash': jd_hash, 'job_description_id': selected_jd_id}, {
+                    'resume_id': str(resume_ids[resume_hash]),
+                    'similarity_score': similarity_score * 100,
+                    'extracted_skills': skills,
+                    'extracted_experience': experience,
+                    'timings': resume_timings,
+                    'jd_version': job_description.get('version', 0),
+                    'created_at': now,
+                })
+                for resume_hash, (experience, skills, similarity_score, _), resume_timings
+                in zip(to_score, analyses, timings)
+            ])
+        memoized.update({
+            result['resume_hash']: result
+            for result in db.analysis_results.find(
+                {
+                    'resume_hash': {'$in': to_score},
+                    'jd_hash': jd_hash,
+                    'job_description_id': selected_jd_id,
+                },
+                {'resume_hash': 1, 'similarity_score': 1, 'extracted_skills': 1},
+            )
+        })
+
+    results = sorted([
+        {
+            'id': str(memoized[resume_hash]['_id']),
+            'filename': resume['filename'],
+            'similarity_score': memoized[resume_hash]['similarity_score'],
+            'extracted_skills': as_skill_list(memoized[resume_hash]['extracted_skills']),
+        }
+        for resume_hash, resume in resumes.items()
+    ], key=lambda row: row['similarity_score'], reverse=True)
+    return results, skipped
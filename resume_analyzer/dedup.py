@@ -0,0 +1,96 @@
+"""
+Content-hash deduplication of resumes and memoization of analyses.
+
+Resumes are fingerprinted twice: ``file_hash`` is the SHA-256 of the
+uploaded bytes and ``content_hash`` the SHA-256 of the extracted text.
+``content_hash`` is unique in ``db.resumes``, so identical resume text is
+stored once however many times it is uploaded. Each analysis result records
+the ``resume_hash`` and ``jd_hash`` it was computed from. A repeated
+(resume, job description) pair is answered from ``analysis_results``
+instead of re-running the ATS pipeline.
+"""
+import datetime
+import hashlib
+
+from pymongo import ReturnDocument
+
+from .storage import dump_text
+
+
+def content_hash(text):
+    """SHA-256 hex digest of a resume's extracted text."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def hash_uploaded_file(uploaded_file):
+    """SHA-256 hex digest of an ``UploadedFile``'s bytes, read chunk by chunk."""
+    digest = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+
+def store_resume(db, filename, content, job_description_id, file_hash=None):
+    """
+    Insert a resume unless one with identical text already exists, and
+    return the ``_id`` of the stored document either way.
+    """
+    fields = {
+        'filename': filename,
+        'content': dump_text(content),
+        'job_description_id': job_description_id,  # JD it was first uploaded for
+        'uploaded_at': datetime.datetime.now()
+    }
+    if file_hash is not None:
+        fields['file_hash'] = file_hash
+
+    resume = db.resumes.find_one_and_update(
+        {'content_hash': content_hash(content)},
+        {'$setOnInsert': fields},
+        projection={'_id': 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return resume['_id']
+
+
+def find_resume_hash_by_file(db, file_hash):
+    """``content_hash`` of a previously stored upload with these exact bytes, or None."""
+    resume = db.resumes.find_one({'file_hash': file_hash}, {'content_hash': 1})
+    return resume.get('content_hash') if resume else None
+
+
+def find_memoized_result(db, resume_hash, jd_hash, job_description_id):
+    """
+    A previous analysis of this resume text against this JD text.
+
+    Prefers a result stored for ``job_description_id`` itself; otherwise
+    returns one computed for another job description with identical text
+    (whose scores can be copied), or None.
+    """
+    query = {'resume_hash': resume_hash, 'jd_hash': jd_hash}
+    return (
+        db.analysis_results.find_one(dict(query, job_description_id=job_description_id))
+        or db.analysis_results.find_one(query)
+    )
+
+
+def store_result(db, result):
+    """
+    Insert an analysis result keyed by ``(resume_hash, jd_hash,
+    job_description_id)``; concurrent identical analyses converge on one
+    document. Returns the ``_id`` of the stored result.
+    """
+    stored = db.analysis_results.find_one_and_update(
+        {
+            'resume_hash': result['resume_hash'],
+            'jd_hash': result['jd_hash'],
+            'job_description_id': result['job_description_id'],
+        },
+        {'$setOnInsert': result},
+        projection={'_id': 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return stored['_id']
@@ -0,0 +1,270 @@
+"""
+Warm pool of ATS engines shared by the request workers.
+
+``simple_ats.ats.ATS`` loads a spaCy pipeline in its constructor and a
+SentenceTransformer model inside every ``compute_similarity()`` call, so
+building a fresh ``ATS()`` per upload pays for both on every request. The pool
+keeps a fixed number of engines with both models already loaded; views check
+one out for the duration of an analysis and hand it back afterwards.
+
+simple_ats and sentence_transformers (spaCy, PyTorch) are imported when the
+first engine is built, so processes that never analyze a resume, and
+modules that only import this one, don't load them.
+"""
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .metrics import apportion, timed
+from .skills import normalize_skills
+
+# Same model simple_ats instantiates inside ATS.compute_similarity()
+SENTENCE_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+
+class EnginePoolTimeout(Exception):
+    """Raised when no engine becomes available within the checkout timeout."""
+
+
+class ATSEngine:
+    """An ``ATS`` instance paired with a preloaded sentence embedding model."""
+
+    def __init__(self, model_name=SENTENCE_MODEL_NAME):
+        from sentence_transformers import SentenceTransformer
+        from simple_ats.ats import ATS
+
+        self.ats = ATS()
+        self.model = SentenceTransformer(model_name)
+
+    def compute_jd_features(self, jd_content):
+        """
+        The job-description half of the comparison: cleaned JD text and its
+        sentence embedding. Results are cached by ``jd_cache`` so a JD is only
+        processed once no matter how many resumes are scored against it.
+        """
+        with timed('compute_jd_features'):
+            self.ats.load_job_description(jd_content)
+            cleaned_jd_text = self.ats.clean_jd()
+            return {
+                'cleaned': cleaned_jd_text,
+                'embedding': self.model.encode(cleaned_jd_text),
+            }
+
+    def encode_resume(self):
+        """
+        Sentence embedding of the loaded resume's cleaned experience and
+        skills, the vector ``ATS.compute_similarity()`` compares to the JD.
+        """
+        return self.model.encode(self.ats.cleaned_experience + self.ats.cleaned_skills)
+
+    def _extract_resume_features(self, resume_content, timings=None):
+        ats = self.ats
+
+        with timed('load_resume', timings):
+            ats.load_resume(resume_content)
+
+        with timed('extract_experience', timings):
+            experience = ats.extract_experience()
+
+        with timed('clean_experience', timings):
+            ats.clean_experience(experience)
+
+        with timed('extract_skills', timings):
+            extracted_skills = list(ats.extract_skills())
+
+        with timed('clean_skills', timings):
+            # The embedding is computed from the skills as extracted, as
+            # ATS.compute_similarity() does
+            ats.clean_skills(" ".join(extracted_skills))
+
+        return experience, normalize_skills(extracted_skills)
+
+    def analyze(self, resume_content, jd_features, timings=None):
+        """
+        Run the resume side of the ATS pipeline and score it against
+        precomputed job-description features (see ``compute_jd_features``).
+
+        Equivalent of ``ATS.compute_similarity()`` that reuses the preloaded
+        model and the cached JD embedding, so only the resume is encoded.
+
+        Returns a tuple of ``(experience, skills, similarity_score,
+        resume_embedding)`` where ``skills`` is the normalized skill list,
+        ``similarity_score`` is the raw similarity tensor returned by the model
+        and ``resume_embedding`` the resume's vector (see ``encode_resume``).
+        Stage durations are added to ``timings`` if given (see ``metrics``).
+        """
+        experience, skills = self._extract_resume_features(resume_content, timings)
+
+        with timed('encode_resume', timings):
+            resume_embedding = self.encode_resume()
+        with timed('compute_similarity', timings):
+            similarity_score = self.model.similarity(resume_embedding, jd_features['embedding'])
+
+        return experience, skills, similarity_score, resume_embedding
+
+    def embed_many(self, resume_contents, batch_size=32, timings=None):
+        """
+        Run the text stages for each resume and encode them all in batched
+        model calls. Returns ``(extracted, embeddings)`` where ``extracted``
+        is a list of ``(experience, skills)`` tuples in input order.
+
+        ``timings``, if given, is a list with one dict per resume; the batched
+        encode is apportioned evenly across them.
+        """
+        extracted = []
+        cleaned_resumes = []
+        for i, resume_content in enumerate(resume_contents):
+            resume_timings = None if timings is None else timings[i]
+            experience, skills = self._extract_resume_features(resume_content, resume_timings)
+            extracted.append((experience, skills))
+            cleaned_resumes.append(self.ats.cleaned_experience + self.ats.cleaned_skills)
+
+        if not cleaned_resumes:
+            return [], []
+
+        start = time.perf_counter()
+        embeddings = self.model.encode(cleaned_resumes, batch_size=batch_size)
+        apportion('encode_resume', time.perf_counter() - start, timings)
+        return extracted, embeddings
+
+    def analyze_many(self, resume_contents, jd_features, batch_size=32, timings=None):
+        """
+        Batch variant of ``analyze()``: the text stages run per resume, but
+        all resumes are encoded and scored in batched model calls.
+
+        Returns a list of ``(experience, skills, similarity_score,
+        resume_embedding)`` tuples in input order, with ``similarity_score``
+        as a plain float in ``[0, 1]``. ``timings`` is as for ``embed_many``.
+        """
+        extracted, resume_embeddings = self.embed_many(resume_contents, batch_size, timings)
+        if not extracted:
+            return []
+
+        start = time.perf_counter()
+        scores = self.model.similarity(resume_embeddings, jd_features['embedding'])
+        apportion('compute_similarity', time.perf_counter() - start, timings)
+
+        return [
+            (experience, skills, float(scores[i].item()), resume_embeddings[i])
+            for i, (experience, skills) in enumerate(extracted)
+        ]
+
+
+
+class EnginePool:
+    """
+    Thread-safe, bounded pool of ``ATSEngine`` instances.
+
+    Engines are created lazily up to ``size`` (or eagerly via ``preload()``)
+    and reused for the lifetime of the process. ``checkout()`` blocks until an
+    engine is free and records how long each caller had to wait.
+    """
+
+    def __init__(self, size, factory=ATSEngine, timeout=None):
+        if size < 1:
+            raise ValueError("Engine pool size must be at least 1.")
+        self.size = size
+        self.timeout = timeout
+        self._factory = factory
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+        # Checkout wait-time metrics
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _reserve_slot(self):
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return True
+        return False
+
+    def _create(self):
+        try:
+            return self._factory()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def preload(self):
+        """Create engines until the pool is full. Safe to call repeatedly."""
+        while self._reserve_slot():
+            self._idle.put(self._create())
+
+    def _acquire(self, timeout):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        if self._reserve_slot():
+            return self._create()
+
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            with self._lock:
+                self._timeouts += 1
+            raise EnginePoolTimeout(
+                f"No ATS engine became available within {timeout} seconds."
+            )
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        """Borrow an engine for the duration of a ``with`` block."""
+        if timeout is None:
+            timeout = self.timeout
+
+        started = time.perf_counter()
+        engine = self._acquire(timeout)
+        waited = time.perf_counter() - started
+
+        with self._lock:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        try:
+            yield engine
+        finally:
+            self._idle.put(engine)
+
+    def stats(self):
+        """Snapshot of pool occupancy and checkout wait-time metrics."""
+        with self._lock:
+            checkouts = self._checkouts
+            return {
+                'size': self.size,
+                'created': self._created,
+                'idle': self._idle.qsize(),
+                'checkouts': checkouts,
+                'timeouts': self._timeouts,
+                'wait_seconds_total': self._wait_total,
+                'wait_seconds_avg': self._wait_total / checkouts if checkouts else 0.0,
+                'wait_seconds_max': self._wait_max,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_engine_pool():
+    """Return the process-wide engine pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = EnginePool(
+                    size=getattr(settings, 'ATS_ENGINE_POOL_SIZE', 2),
+                    timeout=getattr(settings, 'ATS_ENGINE_CHECKOUT_TIMEOUT', 30),
+                )
+    return _pool
@@ -0,0 +1,135 @@
+"""
+Streaming CSV and NDJSON export of the applicant list.
+
+Rows come from one aggregation cursor ordered like the applicants page,
+with the resume's filename joined by ``$lookup``. Job description titles
+come from the cached catalog instead of being joined per row. Rows are
+encoded and sent in chunks of ``EXPORT_CHUNK_ROWS`` as the cursor yields
+them, so a web worker holds one cursor batch and one chunk however many
+applicants match. WSGI servers buffer async streaming responses, so the
+export view uses the sync versions (``iter_export_rows``, ``iter_stream``)
+there.
+"""
+import csv
+import io
+import json
+
+from .jd_catalog import aget_catalog, get_catalog
+from .queries import lookup_resume
+from .skills import as_skill_list
+
+COLUMNS = ['result_id', 'resume_id', 'filename', 'job_description_id', 'job_title',
+           'similarity_score', 'skills', 'created_at']
+
+# Spreadsheets evaluate cells starting with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+# Rows encoded per chunk handed to the server
+EXPORT_CHUNK_ROWS = 500
+# Documents fetched per cursor round-trip
+EXPORT_BATCH_SIZE = 1000
+
+
+def applicants_export_pipeline(match):
+    """Every applicant matching ``match``, best score first."""
+    return [
+        {'$match': match},
+        {'$sort': {'similarity_score': -1, '_id': -1}},
+        {'$project': {
+            'resume_id': 1,
+            'job_description_id': 1,
+            'similarity_score': 1,
+            'extracted_skills': 1,
+            'created_at': 1,
+        }},
+        lookup_resume(['filename']),
+        {'$unwind': {'path': '$resume', 'preserveNullAndEmptyArrays': True}},
+    ]
+
+
+def _csv_cell(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _export_row(result, titles):
+    created_at = result.get('created_at')
+    return {
+        'result_id': str(result['_id']),
+        'resume_id': result.get('resume_id'),
+        'filename': (result.get('resume') or {}).get('filename'),
+        'job_description_id': result.get('job_description_id'),
+        'job_title': titles.get(result.get('job_description_id')),
+        'similarity_score': round(result['similarity_score'], 2),
+        'skills': '; '.join(as_skill_list(result.get('extracted_skills'))),
+        'created_at': created_at.isoformat() if created_at else None,
+    }
+
+
+async def export_rows(adb, match):
+    """Yield one dict per applicant, with the keys in ``COLUMNS``."""
+    titles = {jd['id']: jd['title'] for jd in await aget_catalog(adb)}
+    cursor = await adb.analysis_results.aggregate(
+        applicants_export_pipeline(match), batchSize=EXPORT_BATCH_SIZE
+    )
+    async for result in cursor:
+        yield _export_row(result, titles)
+
+
+def iter_export_rows(db, match):
+    """``export_rows`` for a sync database, for WSGI servers."""
+    titles = {jd['id']: jd['title'] for jd in get_catalog()}
+    cursor = db.analysis_results.aggregate(applicants_export_pipeline(match), batchSize=EXPORT_BATCH_SIZE)
+    for result in cursor:
+        yield _export_row(result, titles)
+
+
+def csv_encoder():
+    """The header and a row encoder of a CSV export."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNS)
+
+    def encode(row):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow({column: _csv_cell(value) for column, value in row.items()})
+        return buffer.getvalue()
+
+    writer.writeheader()
+    return buffer.getvalue(), encode
+
+
+def ndjson_encoder():
+    """The (empty) header and a row encoder of a newline-delimited JSON export."""
+    return '', lambda row: json.dumps(row) + '\n'
+
+
+async def stream(rows, encoder):
+    """Text chunks of ``rows`` encoded with ``encoder``, header first."""
+    header, encode = encoder()
+    if header:
+        yield header
+    chunk = []
+    async for row in rows:
+        chunk.append(encode(row))
+        if len(chunk) == EXPORT_CHUNK_ROWS:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def iter_stream(rows, encoder):
+    """``stream`` over a sync iterator of rows, for WSGI servers."""
+    header, encode = encoder()
+    if header:
+        yield header
+    chunk = []
+    for row in rows:
+        chunk.append(encode(row))
+        if len(chunk) == EXPORT_CHUNK_ROWS:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
@@ -0,0 +1,288 @@
+"""
+Resume text extraction.
+
+Kept free of Django models and the ATS stack so it can run inside worker
+processes without loading the NLP models. PDFs are parsed with PyMuPDF in
+the processes of an ``ExtractionPool``, never in the calling process, so a
+document that overruns its time budget can be stopped by killing its
+worker. PDFs are read from a path when one is available, and streams are
+spilled to disk in chunks, instead of copying whole documents into memory.
+Large documents are split into page ranges and extracted in parallel.
+Every document is bounded by ``ATS_UPLOAD_MAX_BYTES``,
+``ATS_PDF_MAX_PAGES`` and a ``ATS_PDF_TIME_BUDGET`` in seconds.
+"""
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger(__name__)
+
+# Bytes copied per read when spilling a stream to disk
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+class ExtractionError(Exception):
+    """Raised when a resume's text cannot be extracted."""
+
+
+class ExtractionLimitExceeded(ExtractionError):
+    """Raised when a document exceeds the configured size or time limits."""
+
+
+def _setting(name, default):
+    try:
+        return getattr(settings, name, default)
+    except ImproperlyConfigured:
+        # Running outside a configured Django process
+        return default
+
+
+class _Worker:
+    """One extraction process and the pipe it takes tasks from."""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+def _serve(conn):
+    """Worker process loop: run each ``(func, args)`` received, reply ``(ok, value)``."""
+    while True:
+        try:
+            func, args = conn.recv()
+        except EOFError:
+            return
+        try:
+            reply = (True, func(*args))
+        except Exception as e:
+            reply = (False, e)
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # The result or exception could not be pickled
+            conn.send((False, ExtractionError(str(e))))
+
+
+class ExtractionPool:
+    """
+    Worker processes for PDF extraction that can be killed mid-task.
+
+    ``run`` hands one call to an idle worker and waits until the deadline.
+    A worker that overruns it is killed, which stops a pathological page
+    where a thread or a ``ProcessPoolExecutor`` task would keep running.
+    A fresh worker takes its place on the next call. Workers are spawned
+    rather than forked so they don't inherit the web process's loaded
+    models or threads.
+    """
+
+    def __init__(self, size, context=None):
+        self.size = size
+        self._context = context or multiprocessing.get_context('spawn')
+        self._idle = []
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+    def run(self, func, args, deadline):
+        """
+        ``func(*args)`` in a worker process. Raises ``ExtractionLimitExceeded``
+        if it has not returned by ``deadline`` (a ``time.monotonic()`` value),
+        including time spent waiting for a free worker.
+        """
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise ExtractionLimitExceeded("PDF extraction exceeded its time budget waiting for a worker.")
+        worker = None
+        try:
+            with self._lock:
+                worker = self._idle.pop() if self._idle else None
+            if worker is None or not worker.process.is_alive():
+                if worker is not None:
+                    worker.kill()
+                worker = _Worker(self._context)
+
+            worker.conn.send((func, args))
+            if not worker.conn.poll(max(0.0, deadline - time.monotonic())):
+                worker.kill()
+                worker = None
+                raise ExtractionLimitExceeded("PDF extraction exceeded its time budget.")
+            ok, value = worker.conn.recv()
+        except (EOFError, OSError) as e:
+            if worker is not None:
+                worker.kill()
+                worker = None
+            raise ExtractionError(f"The extraction worker exited unexpectedly: {e}")
+        finally:
+            if worker is not None:
+                with self._lock:
+                    self._idle.append(worker)
+            self._slots.release()
+
+        if not ok:
+            raise value
+        return value
+
+    def shutdown(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.kill()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_extraction_pool():
+    """Process-wide extraction pool, shared by every upload."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ExtractionPool(_setting('ATS_EXTRACTION_WORKERS', None) or os.cpu_count())
+    return _pool
+
+
+def _after_fork_in_child():
+    # The parent's workers are not this process's children
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def check_size(size):
+    """Raise ``ExtractionLimitExceeded`` if an upload of ``size`` bytes is too large."""
+    max_bytes = _setting('ATS_UPLOAD_MAX_BYTES', 10 * 1024 * 1024)
+    if size > max_bytes:
+        raise ExtractionLimitExceeded(
+            f"Resume is {size} bytes; the maximum allowed is {max_bytes} bytes."
+        )
+
+
+def _open_pdf(source):
+    import fitz  # PyMuPDF
+
+    if isinstance(source, (bytes, bytearray)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+
+def _pdf_page_count(source):
+    """Pages in the PDF at ``source`` (a path or bytes); runs in a worker process."""
+    with _open_pdf(source) as pdf_document:
+        return len(pdf_document)
+
+
+def _extract_page_range(source, start, stop):
+    """Text of pages ``[start, stop)`` of the PDF at ``source``; runs in a worker process."""
+    with _open_pdf(source) as pdf_document:
+        return [pdf_document[page_num].get_text() for page_num in range(start, stop)]
+
+
+def _extract_pdf_parallel(path, page_count, deadline):
+    pool = get_extraction_pool()
+    chunk_size = max(1, -(-page_count // pool.size))
+    ranges = [(start, min(start + chunk_size, page_count)) for start in range(0, page_count, chunk_size)]
+    # Every range is bounded by the deadline, so a failure leaves nothing running
+    with ThreadPoolExecutor(max_workers=len(ranges)) as threads:
+        chunks = list(threads.map(lambda pages: pool.run(_extract_page_range, (path, *pages), deadline), ranges))
+    return [page for chunk in chunks for page in chunk]
+
+
+def _extract_pdf(path, file_bytes, parallel):
+    max_pages = _setting('ATS_PDF_MAX_PAGES', 50)
+    parallel_min_pages = _setting('ATS_PDF_PARALLEL_MIN_PAGES', 16)
+    deadline = time.monotonic() + _setting('ATS_PDF_TIME_BUDGET', 30)
+
+    pool = get_extraction_pool()
+    source = path if path is not None else file_bytes
+    page_count = pool.run(_pdf_page_count, (source,), deadline)
+    if page_count > max_pages:
+        logger.info("PDF has %s pages; extracting only the first %s.", page_count, max_pages)
+        page_count = max_pages
+
+    if not parallel or page_count < parallel_min_pages:
+        return "".join(pool.run(_extract_page_range, (source, 0, page_count), deadline))
+
+    if path is not None:
+        return "".join(_extract_pdf_parallel(path, page_count, deadline))
+
+    # Workers open the document by path; spill in-memory uploads once
+    with tempfile.NamedTemporaryFile(suffix='.pdf') as spill:
+        spill.write(file_bytes)
+        spill.flush()
+        return "".join(_extract_pdf_parallel(spill.name, page_count, deadline))
+
+
+def _read_text_file(path, file_bytes):
+    if path is not None:
+        with open(path, 'rb') as f:
+            file_bytes = f.read()
+    return file_bytes.decode('utf-8', errors='ignore')
+
+
+def extract_text(filename, source, parallel=True):
+    """
+    Extract plain text from a resume given as ``bytes`` or a file path.
+
+    PDFs are parsed with PyMuPDF, falling back to a plain UTF-8 decode if the
+    document cannot be opened; every other format is decoded as UTF-8.
+    ``parallel=False`` disables page-parallel extraction, for callers that
+    extract many documents at once.
+
+    Raises ``ExtractionLimitExceeded`` when the document is too large or
+    takes longer than its time budget.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        path, file_bytes = None, source
+        check_size(len(file_bytes))
+    else:
+        path, file_bytes = os.fspath(source), None
+        check_size(os.path.getsize(path))
+
+    file_extension = os.path.splitext(filename)[1].lower()
+
+    if file_extension == '.pdf':
+        try:
+            return _extract_pdf(path, file_bytes, parallel)
+        except ExtractionError:
+            raise
+        except Exception as e:
+            # Fallback to simple decoding if PDF extraction fails
+            logger.warning("PDF extraction error: %s", e)
+
+    # For non-PDF files, use simple decoding
+    return _read_text_file(path, file_bytes)
+
+
+def extract_stream(filename, fileobj, parallel=True):
+    """
+    Extract text from a file-like object (e.g. a GridFS file) by streaming it
+    into a temporary file in chunks, enforcing ``ATS_UPLOAD_MAX_BYTES`` as it
+    goes, and extracting from that path.
+    """
+    suffix = os.path.splitext(filename)[1].lower()
+    with tempfile.NamedTemporaryFile(suffix=suffix) as spill:
+        copied = 0
+        for chunk in iter(lambda: fileobj.read(STREAM_CHUNK_SIZE), b''):
+            copied += len(chunk)
+            check_size(copied)
+            spill.write(chunk)
+        spill.flush()
+        return extract_text(filename, spill.name, parallel)
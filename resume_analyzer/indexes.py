@@ -0,0 +1,67 @@
+"""
+MongoDB indexes used by the resume analyzer's queries.
+
+Create them with ``python manage.py ensure_indexes``; ``create_index`` is
+idempotent, so the command is safe to run on every deploy.
+"""
+from django.conf import settings
+from pymongo import ASCENDING, DESCENDING, TEXT
+
+# collection name -> list of (keys, options)
+INDEXES = {
+    'resumes': [
+        # Identical resume text is stored only once (documents from before
+        # deduplication have no content_hash and are left alone)
+        ([('content_hash', ASCENDING)], {
+            'unique': True,
+            'partialFilterExpression': {'content_hash': {'$exists': True}},
+        }),
+        # Upload fast path: exact same file bytes seen before
+        ([('file_hash', ASCENDING)], {}),
+        # Resume matrix: incremental refresh of newly written embeddings
+        ([('embedding_model', ASCENDING), ('embedded_at', ASCENDING)], {}),
+    ],
+    'analysis_results': [
+        # Memoized analyses: one result per resume text, JD text and JD
+        ([('resume_hash', ASCENDING), ('jd_hash', ASCENDING), ('job_description_id', ASCENDING)], {
+            'unique': True,
+            'partialFilterExpression': {'resume_hash': {'$exists': True}},
+        }),
+        # view_applicants: unfiltered listing ordered by score, keyset pagination
+        ([('similarity_score', DESCENDING), ('_id', DESCENDING)], {}),
+        # view_applicants filtered by job description (and score range)
+        ([('job_description_id', ASCENDING), ('similarity_score', DESCENDING), ('_id', DESCENDING)], {}),
+        # Skill search, with or without a job description: the first required
+        # skill is an equality on the multikey field, the scan stays in score
+        # order and date ranges are checked on the index keys
+        ([('job_description_id', ASCENDING), ('extracted_skills', ASCENDING), ('similarity_score', DESCENDING),
+          ('_id', DESCENDING), ('created_at', DESCENDING)], {}),
+        ([('extracted_skills', ASCENDING), ('similarity_score', DESCENDING), ('_id', DESCENDING),
+          ('created_at', DESCENDING)], {}),
+        # Keyword search over what was extracted from each resume
+        ([('extracted_skills', TEXT), ('extracted_experience', TEXT)], {
+            'name': 'extracted_text',
+            'weights': {'extracted_skills': 5, 'extracted_experience': 1},
+            'default_language': 'english',
+        }),
+    ],
+    'job_descriptions': [
+        # Job description catalog, newest first
+        ([('created_at', DESCENDING)], {}),
+    ],
+    'analysis_jobs': [
+        # Workers claim the oldest runnable job
+        ([('status', ASCENDING), ('next_attempt_at', ASCENDING), ('created_at', ASCENDING)], {}),
+    ],
+}
+
+
+def ensure_indexes(db=None):
+    """Create every index in ``INDEXES``; returns the names of the indexes."""
+    if db is None:
+        db = settings.DB
+    created = []
+    for collection_name, indexes in INDEXES.items():
+        for keys, options in indexes:
+            created.append(db[collection_name].create_index(keys, **options))
+    return created
@@ -0,0 +1,143 @@
+"""
+Cache of job-description features keyed by a hash of the JD content.
+
+A handful of job descriptions get scored against thousands of resumes, so the
+JD half of the comparison (text cleaning and the sentence embedding) is
+computed once per distinct content and reused. Entries live in a per-process
+LRU and, when ``ATS_JD_CACHE_PERSIST`` is enabled, in the ``jd_features``
+MongoDB collection so other workers and restarts can reuse them.
+
+Because keys are content hashes, an edited JD can never be served stale
+features; invalidation on edit/delete only frees the entries of the old
+content.
+"""
+import datetime
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .engine import SENTENCE_MODEL_NAME
+from .storage import dump_vector, load_vector
+
+
+def jd_content_hash(content):
+    """SHA-256 hex digest of a job description's text."""
+    return hashlib.sha256((content or '').encode('utf-8')).hexdigest()
+
+
+class JDFeatureCache:
+    """In-memory LRU of JD features with an optional MongoDB-backed tier."""
+
+    def __init__(self, max_entries=128, collection=None):
+        self.max_entries = max_entries
+        self.collection = collection
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get_local(self, key):
+        with self._lock:
+            features = self._entries.get(key)
+            if features is not None:
+                self._entries.move_to_end(key)
+            return features
+
+    def _put_local(self, key, features):
+        with self._lock:
+            self._entries[key] = features
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _get_persisted(self, key):
+        if self.collection is None:
+            return None
+        doc = self.collection.find_one({'_id': key, 'model': SENTENCE_MODEL_NAME})
+        if doc is None:
+            return None
+        return {
+            'cleaned': doc['cleaned'],
+            'embedding': load_vector(doc['embedding']),
+        }
+
+    def _put_persisted(self, key, features):
+        if self.collection is None:
+            return
+        self.collection.replace_one(
+            {'_id': key},
+            {
+                'model': SENTENCE_MODEL_NAME,
+                'cleaned': features['cleaned'],
+                'embedding': dump_vector(features['embedding']),
+                'created_at': datetime.datetime.now(),
+            },
+            upsert=True,
+        )
+
+    def get_or_compute(self, content, compute):
+        """
+        Return the cached features for ``content``, calling
+        ``compute(content)`` and storing its result on a miss.
+        """
+        key = jd_content_hash(content)
+
+        features = self._get_local(key)
+        if features is None:
+            features = self._get_persisted(key)
+            if features is not None:
+                self._put_local(key, features)
+
+        if features is not None:
+            self.hits += 1
+            return features
+
+        self.misses += 1
+        features = compute(content)
+        self._put_local(key, features)
+        self._put_persisted(key, features)
+        return features
+
+    def invalidate(self, content):
+        """Drop the cached features for a job description's content."""
+        key = jd_content_hash(content)
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.collection is not None:
+            self.collection.delete_one({'_id': key})
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_jd_feature_cache():
+    """Return the process-wide JD feature cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                collection = None
+                if getattr(settings, 'ATS_JD_CACHE_PERSIST', False):
+                    collection = settings.DB.jd_features
+                _cache = JDFeatureCache(
+                    max_entries=getattr(settings, 'ATS_JD_CACHE_SIZE', 128),
+                    collection=collection,
+                )
+    return _cache
+
+
+def invalidate_job_description(job_description):
+    """
+    Invalidate cached features for a stored job description's previous
+    content (the document as read before it was updated or deleted). Call
+    after the write, so nothing re-caches the old content in between.
+    """
+    if job_description is not None:
+        get_jd_feature_cache().invalidate(job_description.get('content'))
@@ -0,0 +1,62 @@
+"""
+Cached job description catalog.
+
+Every page with a job description dropdown needs only ids and titles; the
+management page also shows each description's text. Both lists are served
+from Django's cache and rebuilt on a miss with one query sorted on the
+``created_at`` index. The views that add, edit or delete a job description
+call ``invalidate_catalog()`` after writing. ``ATS_JD_CATALOG_TTL`` bounds
+how long another process's local cache can lag behind such a write; use a
+shared backend (file or memcached) to invalidate across processes.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+SUMMARY_KEY = 'jd_catalog:summary'
+FULL_KEY = 'jd_catalog:full'
+
+
+def _key_and_projection(full):
+    if full:
+        return FULL_KEY, {'title': 1, 'content': 1, 'created_at': 1}
+    return SUMMARY_KEY, {'title': 1, 'created_at': 1}
+
+
+def _with_ids(job_descriptions):
+    # Templates can't read _id, so expose it as a string id
+    for jd in job_descriptions:
+        jd['id'] = str(jd['_id'])
+    return job_descriptions
+
+
+def get_catalog(full=False):
+    """
+    Job descriptions newest first, as dicts with ``id``, ``title`` and
+    ``created_at`` (plus ``content`` when ``full``).
+    """
+    key, projection = _key_and_projection(full)
+    catalog = cache.get(key)
+    if catalog is None:
+        catalog = _with_ids(list(settings.DB.job_descriptions.find({}, projection).sort('created_at', -1)))
+        cache.set(key, catalog, settings.ATS_JD_CATALOG_TTL)
+    return catalog
+
+
+async def aget_catalog(adb, full=False):
+    """Async ``get_catalog`` reading misses through ``adb`` (see ``async_db``)."""
+    key, projection = _key_and_projection(full)
+    catalog = await cache.aget(key)
+    if catalog is None:
+        cursor = adb.job_descriptions.find({}, projection).sort('created_at', -1)
+        catalog = _with_ids(await cursor.to_list(None))
+        await cache.aset(key, catalog, settings.ATS_JD_CATALOG_TTL)
+    return catalog
+
+
+def invalidate_catalog():
+    """Drop the cached lists after a job description is added, edited or deleted."""
+    cache.delete_many([SUMMARY_KEY, FULL_KEY])
+
+
+async def ainvalidate_catalog():
+    await cache.adelete_many([SUMMARY_KEY, FULL_KEY])
@@ -0,0 +1,498 @@
+"""
+Background analysis jobs.
+
+``upload_resume`` streams the uploaded file into GridFS (``resume_uploads``),
+records an ``analysis_jobs`` document and returns immediately; worker threads claim jobs, run extraction and the
+ATS pipeline, and write ``resumes`` / ``analysis_results``. The MongoDB
+collection is the source of truth, the in-process queue only wakes workers
+up early, so jobs survive restarts. By default they are processed by a
+separate ``manage.py run_analysis_worker`` process, keeping scoring out of
+web processes; ``ATS_JOB_WORKERS`` starts worker threads in each web
+process instead.
+
+Claiming is an atomic ``find_one_and_update`` with a lease, so several
+processes can share the collection. A heartbeat extends the lease while
+the job runs, so only jobs whose worker died are claimed again. Failed jobs,
+and jobs whose worker died, are retried with exponential backoff up to
+``ATS_JOB_MAX_ATTEMPTS``.
+
+The same queue carries ``bulk`` jobs, one per bulk upload, which score a
+batch of resumes with ``bulk.analyze_uploads`` and keep the ranked summary
+on the job, and ``rescore`` jobs, queued when a job description is edited,
+which bring its existing results up to date (see ``rescoring``).
+"""
+import datetime
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from functools import partial
+
+import gridfs
+from django.conf import settings
+from pymongo import ReturnDocument
+
+from .ann import index_resumes
+from .bulk import analyze_uploads
+from .dedup import content_hash, find_memoized_result, store_resume, store_result
+from .engine import get_engine_pool
+from .extraction import ExtractionLimitExceeded, extract_stream
+from .jd_cache import get_jd_feature_cache, jd_content_hash
+from .metrics import timed
+from .ranking import store_resume_embedding
+from .rescoring import rescore_job_description
+from .skills import as_skill_list
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+RETRYING = 'retrying'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+# The lease is extended this many times per ATS_JOB_LEASE_SECONDS while a job runs
+HEARTBEATS_PER_LEASE = 3
+
+# Job kinds; analysis jobs predate the field and have no kind
+BULK = 'bulk'
+RESCORE = 'rescore'
+
+# Progress reported for each stage, as a percentage
+STAGE_PROGRESS = {
+    QUEUED: 0,
+    'extracting': 10,
+    'analyzing': 40,
+    'saving': 90,
+    COMPLETED: 100,
+}
+
+
+def _now():
+    return datetime.datetime.now()
+
+
+def _jobs():
+    return settings.DB.analysis_jobs
+
+
+def _uploads():
+    return gridfs.GridFS(settings.DB, collection='resume_uploads')
+
+
+def _wake(job_id):
+    if getattr(settings, 'ATS_JOB_WORKERS', 0) > 0:
+        start_workers()
+        _wakeups.put(job_id)
+
+
+def _new_job(**fields):
+    now = _now()
+    return {
+        'status': QUEUED,
+        'stage': QUEUED,
+        'progress': STAGE_PROGRESS[QUEUED],
+        'attempts': 0,
+        'max_attempts': getattr(settings, 'ATS_JOB_MAX_ATTEMPTS', 3),
+        'next_attempt_at': now,
+        'lease_expires_at': None,
+        'result_id': None,
+        'error': None,
+        'created_at': now,
+        'updated_at': now,
+        **fields,
+    }
+
+
+def submit_analysis_job(uploaded_file, job_description_id, file_hash=None):
+    """
+    Queue an uploaded resume for analysis and return the new job's id as a
+    string. The file is copied to GridFS chunk by chunk, straight from
+    Django's upload buffer or temporary file.
+    """
+    uploaded_file.seek(0)
+    file_id = _uploads().put(uploaded_file, filename=uploaded_file.name)
+
+    job_id = _jobs().insert_one(_new_job(
+        filename=uploaded_file.name,
+        file_id=file_id,
+        file_hash=file_hash,
+        job_description_id=job_description_id,
+    )).inserted_id
+
+    _wake(job_id)
+    return str(job_id)
+
+
+def submit_bulk_job(uploads, job_description_id):
+    """
+    Queue a bulk upload, ``(filename, file)`` pairs (see
+    ``bulk.collect_uploads``), for analysis and return the new job's id as a
+    string, or None if there were no files. Each file is copied to GridFS
+    chunk by chunk. If collecting the uploads fails part way, the files
+    already copied are deleted and the error is raised.
+    """
+    files = []
+    try:
+        for filename, file in uploads:
+            files.append({'filename': filename, 'file_id': _uploads().put(file, filename=filename)})
+    except BaseException:
+        for f in files:
+            _uploads().delete(f['file_id'])
+        raise
+    if not files:
+        return None
+
+    job_id = _jobs().insert_one(_new_job(
+        kind=BULK,
+        filename=f"{len(files)} resume{'s' if len(files) != 1 else ''}",
+        file_id=None,
+        files=files,
+        job_description_id=job_description_id,
+        results=None,
+        skipped=None,
+    )).inserted_id
+
+    _wake(job_id)
+    return str(job_id)
+
+
+def submit_rescore_job(job_description_id):
+    """
+    Queue a background rescore of a job description's out-of-date results
+    (see ``rescoring.rescore_job_description``). Edits made while a rescore
+    is still queued share that job, which always scores against the job
+    description's latest text.
+    """
+    job = _new_job(kind=RESCORE, filename=None, file_id=None, job_description_id=job_description_id)
+    pending = {'kind': RESCORE, 'job_description_id': job_description_id, 'status': {'$in': [QUEUED, RETRYING]}}
+    result = _jobs().update_one(
+        pending, {'$setOnInsert': {k: v for k, v in job.items() if k not in ('kind', 'job_description_id')}},
+        upsert=True,
+    )
+    if result.upserted_id is not None:
+        _wake(result.upserted_id)
+
+
+def count_pending_jobs():
+    """Jobs queued or waiting for a retry."""
+    return _jobs().count_documents({'status': {'$in': [QUEUED, RETRYING]}})
+
+
+def get_job_status(job_id):
+    """The job's document, or None if unknown."""
+    return _jobs().find_one({'_id': job_id})
+
+
+def _fail_abandoned(now):
+    """
+    Fail running jobs whose lease expired on their last attempt. Their
+    worker died (killed, out of memory, ...) every time, so another try
+    would most likely take a worker down again.
+    """
+    abandoned = _jobs().find({
+        'status': RUNNING,
+        'lease_expires_at': {'$lt': now},
+        '$expr': {'$gte': ['$attempts', '$max_attempts']},
+    })
+    for job in abandoned:
+        failed = _jobs().update_one({**_owned(job), 'lease_expires_at': {'$lt': now}}, {'$set': {
+            'status': FAILED,
+            'lease_expires_at': None,
+            'error': "The worker processing this job stopped responding.",
+            'updated_at': now,
+        }})
+        if failed.matched_count:
+            logger.error("Analysis job %s failed: its worker stopped on every attempt", job['_id'])
+            _discard_upload(job)
+
+
+def _claim(job_id=None):
+    """
+    Atomically take ownership of a runnable job: a specific one if ``job_id``
+    is given, otherwise the oldest queued/retrying job that is due, or a
+    running job whose worker's lease has expired and that has attempts left.
+    """
+    now = _now()
+    _fail_abandoned(now)
+    runnable = {'$or': [
+        {'status': {'$in': [QUEUED, RETRYING]}, 'next_attempt_at': {'$lte': now}},
+        {
+            'status': RUNNING,
+            'lease_expires_at': {'$lt': now},
+            '$expr': {'$lt': ['$attempts', '$max_attempts']},
+        },
+    ]}
+    if job_id is not None:
+        runnable['_id'] = job_id
+
+    lease = datetime.timedelta(seconds=getattr(settings, 'ATS_JOB_LEASE_SECONDS', 300))
+    return _jobs().find_one_and_update(
+        runnable,
+        {
+            '$set': {
+                'status': RUNNING,
+                'lease_expires_at': now + lease,
+                'updated_at': now,
+            },
+            '$inc': {'attempts': 1},
+        },
+        sort=[('created_at', 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def _owned(job):
+    # Matches the job only while this claim still holds it; after the lease
+    # was lost, another worker's claim has incremented attempts
+    return {'_id': job['_id'], 'status': RUNNING, 'attempts': job['attempts']}
+
+
+@contextmanager
+def _heartbeat(job):
+    """Extend the job's lease periodically while the block runs."""
+    lease_seconds = getattr(settings, 'ATS_JOB_LEASE_SECONDS', 300)
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(lease_seconds / HEARTBEATS_PER_LEASE):
+            try:
+                extended = _jobs().update_one(_owned(job), {'$set': {
+                    'lease_expires_at': _now() + datetime.timedelta(seconds=lease_seconds),
+                }})
+                if extended.matched_count == 0:
+                    logger.warning("Analysis job %s lost its lease to another worker", job['_id'])
+                    return
+            except Exception as e:
+                logger.warning("Could not extend the lease of analysis job %s: %s", job['_id'], e)
+
+    thread = threading.Thread(target=beat, name=f"ats-job-heartbeat-{job['_id']}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _set_stage(job, stage):
+    _jobs().update_one(
+        _owned(job),
+        {'$set': {'stage': stage, 'progress': STAGE_PROGRESS[stage], 'updated_at': _now()}},
+    )
+
+
+def _run(job):
+    """
+    Extract, analyze and store one claimed job, answering from a memoized
+    analysis when the same resume text was already scored against the same
+    job description text.
+    """
+    db = settings.DB
+
+    job_description = db.job_descriptions.find_one({'_id': job['job_description_id']})
+    if job_description is None:
+        raise LookupError("Selected job description no longer exists.")
+    selected_jd_id = str(job_description['_id'])
+
+    timings = {}
+
+    _set_stage(job, 'extracting')
+    with timed('extraction', timings):
+        resume_content = extract_stream(job['filename'], _uploads().get(job['file_id']))
+
+    # Identical resume text is stored once (see dedup)
+    resume_hash = content_hash(resume_content)
+    jd_hash = jd_content_hash(job_description['content'])
+    with timed('mongo_store_resume', timings):
+        resume_id = store_resume(
+            db, job['filename'], resume_content, selected_jd_id, file_hash=job.get('file_hash')
+        )
+
+    memoized = find_memoized_result(db, resume_hash, jd_hash, selected_jd_id)
+    if memoized is not None and memoized['job_description_id'] == selected_jd_id:
+        logger.info("Identical resume already analyzed for this job description.")
+        return memoized['_id']
+
+    if memoized is not None:
+        # Same resume and JD text under another job description; reuse its scores
+        similarity_score = memoized['similarity_score']
+        skills = as_skill_list(memoized['extracted_skills'])
+        experience = memoized['extracted_experience']
+    else:
+        _set_stage(job, 'analyzing')
+        with get_engine_pool().checkout() as engine:
+            jd_features = get_jd_feature_cache().get_or_compute(
+                job_description['content'], engine.compute_jd_features
+            )
+            experience, skills, similarity_score, resume_embedding = engine.analyze(
+                resume_content, jd_features, timings
+            )
+        similarity_score = float(similarity_score.item() * 100)
+        with timed('mongo_store_embedding', timings):
+            store_resume_embedding(db, resume_id, resume_embedding)
+        index_resumes([resume_id], [resume_embedding])
+
+    logger.info(
+        "Analyzed %s: score %.1f (%s)", job['filename'], similarity_score,
+        ", ".join(f"{stage} {seconds * 1000:.0f} ms" for stage, seconds in timings.items()),
+    )
+    _set_stage(job, 'saving')
+    with timed('mongo_store_result'):
+        result_id = store_result(db, {
+            'resume_id': str(resume_id),
+            'job_description_id': selected_jd_id,
+            'resume_hash': resume_hash,
+            'jd_hash': jd_hash,
+            'similarity_score': similarity_score,
+            'extracted_skills': skills,
+            'extracted_experience': experience,
+            'timings': timings,
+            'jd_version': job_description.get('version', 0),
+            'created_at': _now()
+        })
+
+    _rescore_if_edited(db, job_description)
+    return result_id
+
+
+def _rescore_if_edited(db, job_description):
+    # An edit's rescore may have finished before this job's results were stored
+    current = db.job_descriptions.find_one({'_id': job_description['_id']}, {'version': 1})
+    if current is not None and current.get('version', 0) != job_description.get('version', 0):
+        submit_rescore_job(job_description['_id'])
+
+
+def _run_bulk(job):
+    """Score a bulk upload and keep its ranked summary on the job."""
+    db = settings.DB
+
+    job_description = db.job_descriptions.find_one({'_id': job['job_description_id']})
+    if job_description is None:
+        raise LookupError("Selected job description no longer exists.")
+
+    _set_stage(job, 'extracting')
+    # Each file is read from GridFS only when its extraction starts
+    uploads = [(f['filename'], partial(_uploads().get, f['file_id'])) for f in job['files']]
+    _set_stage(job, 'analyzing')
+    results, skipped = analyze_uploads(db, uploads, job_description)
+    if not results:
+        raise ExtractionLimitExceeded("None of the uploaded resumes could be processed.")
+
+    _set_stage(job, 'saving')
+    _jobs().update_one(_owned(job), {'$set': {'results': results, 'skipped': skipped}})
+    _rescore_if_edited(db, job_description)
+
+
+def _run_rescore(job):
+    _set_stage(job, 'analyzing')
+    rescored = rescore_job_description(settings.DB, job['job_description_id'])
+    logger.info("Rescored %s results for job description %s", rescored, job['job_description_id'])
+
+
+def process_job(job):
+    """Run a claimed job and record its outcome, scheduling a retry on failure."""
+    try:
+        with _heartbeat(job):
+            if job.get('kind') == RESCORE:
+                result_id = _run_rescore(job)
+            elif job.get('kind') == BULK:
+                result_id = _run_bulk(job)
+            else:
+                result_id = _run(job)
+    except Exception as e:
+        logger.exception("Analysis job %s failed (attempt %s): %s", job['_id'], job['attempts'], e)
+
+        # Documents over the size/time limits will fail the same way again
+        retryable = not isinstance(e, ExtractionLimitExceeded)
+        if retryable and job['attempts'] < job['max_attempts']:
+            backoff = getattr(settings, 'ATS_JOB_RETRY_BACKOFF', 5) * 2 ** (job['attempts'] - 1)
+            update = {'$set': {
+                'status': RETRYING,
+                'stage': QUEUED,
+                'progress': STAGE_PROGRESS[QUEUED],
+                'next_attempt_at': _now() + datetime.timedelta(seconds=backoff),
+                'lease_expires_at': None,
+                'error': str(e),
+                'updated_at': _now(),
+            }}
+        else:
+            update = {'$set': {
+                'status': FAILED,
+                'lease_expires_at': None,
+                'error': str(e),
+                'updated_at': _now(),
+            }}
+        recorded = _jobs().update_one(_owned(job), update)
+        if recorded.matched_count and update['$set']['status'] == FAILED:
+            _discard_upload(job)
+        return
+
+    recorded = _jobs().update_one(_owned(job), {'$set': {
+        'status': COMPLETED,
+        'stage': COMPLETED,
+        'progress': STAGE_PROGRESS[COMPLETED],
+        'result_id': str(result_id) if result_id is not None else None,
+        'lease_expires_at': None,
+        'error': None,
+        'updated_at': _now(),
+    }})
+    # The resume is stored in db.resumes now, drop the raw upload (unless
+    # another worker took the job over and is still reading it)
+    if recorded.matched_count:
+        _discard_upload(job)
+
+
+def _discard_upload(job):
+    file_ids = [f['file_id'] for f in job.get('files') or ()]
+    if job.get('file_id') is not None:
+        file_ids.append(job['file_id'])
+    for file_id in file_ids:
+        try:
+            _uploads().delete(file_id)
+        except Exception as e:
+            logger.warning("Could not delete upload for analysis job %s: %s", job['_id'], e)
+
+
+def run_worker(stop_event=None):
+    """
+    Worker loop: process jobs as they are submitted and poll the collection
+    for due retries and jobs orphaned by other processes.
+    """
+    poll_interval = getattr(settings, 'ATS_JOB_POLL_INTERVAL', 5)
+    while stop_event is None or not stop_event.is_set():
+        try:
+            job_id = _wakeups.get(timeout=poll_interval)
+        except queue.Empty:
+            job_id = None
+
+        try:
+            job = _claim(job_id)
+            # Drain everything that is due before waiting again
+            while job is not None:
+                process_job(job)
+                job = _claim()
+        except Exception as e:
+            logger.exception("Analysis worker error: %s", e)
+
+
+_wakeups = queue.Queue()
+_workers = []
+_workers_lock = threading.Lock()
+
+
+def start_workers(count=None):
+    """Start the in-process worker threads once per process."""
+    if count is None:
+        count = getattr(settings, 'ATS_JOB_WORKERS', 0)
+    with _workers_lock:
+        # Threads don't survive a fork, so a forked child starts its own
+        _workers[:] = [worker for worker in _workers if worker.is_alive()]
+        while len(_workers) < count:
+            worker = threading.Thread(
+                target=run_worker,
+                name=f'ats-analysis-worker-{len(_workers)}',
+                daemon=True,
+            )
+            worker.start()
+            _workers.append(worker)
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+
+from resume_analyzer.engine import SENTENCE_MODEL_NAME, get_engine_pool
+from resume_analyzer.ranking import embedding_fields
+from resume_analyzer.storage import load_text
+
+
+class Command(BaseCommand):
+    help = "Compute and store embeddings for resumes analyzed before they were persisted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.ATS_BULK_BATCH_SIZE * 8)
+
+    def handle(self, *args, **options):
+        db = settings.DB
+        batch_size = options['batch_size']
+        missing = {'$or': [
+            {'embedding': {'$exists': False}},
+            {'embedding_model': {'$ne': SENTENCE_MODEL_NAME}},
+        ]}
+
+        done = 0
+        with get_engine_pool().checkout() as engine:
+            while True:
+                # Each pass removes the batch from the query, so always take the first page
+                batch = list(db.resumes.find(missing, {'content': 1}).limit(batch_size))
+                if not batch:
+                    break
+                _, embeddings = engine.embed_many(
+                    [load_text(resume['content']) for resume in batch], batch_size=settings.ATS_BULK_BATCH_SIZE
+                )
+                db.resumes.bulk_write([
+                    UpdateOne({'_id': resume['_id']}, {'$set': embedding_fields(embedding)})
+                    for resume, embedding in zip(batch, embeddings)
+                ], ordered=False)
+                done += len(batch)
+                self.stdout.write(f"Embedded {done} resumes")
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled embeddings for {done} resumes."))
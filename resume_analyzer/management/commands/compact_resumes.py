@@ -0,0 +1,66 @@
+import bson
+from bson.binary import Binary
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+
+from resume_analyzer.storage import dump_text, dump_vector, load_text, load_vector
+
+
+class Command(BaseCommand):
+    help = (
+        "Rewrite stored resumes in the configured compact encodings "
+        "(ATS_RESUME_TEXT_COMPRESSION and ATS_EMBEDDING_DTYPE)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help="Report the savings without writing.")
+
+    def handle(self, *args, **options):
+        db = settings.DB
+        batch_size = options['batch_size']
+
+        scanned = rewritten = bytes_before = bytes_after = 0
+        last_id = None
+        while True:
+            query = {'_id': {'$gt': last_id}} if last_id is not None else {}
+            batch = list(db.resumes.find(query, {'content': 1, 'embedding': 1}).sort('_id', 1).limit(batch_size))
+            if not batch:
+                break
+            last_id = batch[-1]['_id']
+
+            ops = []
+            for resume in batch:
+                fields = {}
+                if 'content' in resume:
+                    fields['content'] = dump_text(load_text(resume['content']))
+                if 'embedding' in resume:
+                    fields['embedding'] = dump_vector(load_vector(resume['embedding']))
+                changed = {
+                    field: value for field, value in fields.items()
+                    if not _same_encoding(resume[field], value)
+                }
+                if not changed:
+                    continue
+                bytes_before += len(bson.encode({field: resume[field] for field in changed}))
+                bytes_after += len(bson.encode(changed))
+                ops.append(UpdateOne({'_id': resume['_id']}, {'$set': changed}))
+
+            if ops and not options['dry_run']:
+                db.resumes.bulk_write(ops, ordered=False)
+            scanned += len(batch)
+            rewritten += len(ops)
+            self.stdout.write(f"Scanned {scanned} resumes, {rewritten} to rewrite")
+
+        verb = "Would rewrite" if options['dry_run'] else "Rewrote"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {rewritten} of {scanned} resumes: {bytes_before / 1e6:.2f} MB -> {bytes_after / 1e6:.2f} MB."
+        ))
+
+
+def _same_encoding(stored, encoded):
+    if isinstance(stored, Binary) and isinstance(encoded, Binary):
+        # A resume already compressed with another codec is left alone
+        return stored.subtype == encoded.subtype
+    return type(stored) is type(encoded)
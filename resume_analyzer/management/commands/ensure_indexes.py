@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from resume_analyzer.indexes import ensure_indexes
+
+
+class Command(BaseCommand):
+    help = "Create the MongoDB indexes the resume analyzer relies on."
+
+    def handle(self, *args, **options):
+        for name in ensure_indexes():
+            self.stdout.write(f"Ensured index {name}")
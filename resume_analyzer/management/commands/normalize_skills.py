@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+
+from resume_analyzer.skills import as_skill_list
+
+
+class Command(BaseCommand):
+    help = "Convert analysis results' space-joined extracted_skills strings to normalized skill arrays."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        db = settings.DB
+        # {'$type': 'string'} would also match arrays of strings
+        legacy = {'extracted_skills': {'$exists': True, '$not': {'$type': 'array'}}}
+
+        done = 0
+        while True:
+            # Each pass removes the batch from the query, so always take the first page
+            batch = list(db.analysis_results.find(legacy, {'extracted_skills': 1}).limit(options['batch_size']))
+            if not batch:
+                break
+            db.analysis_results.bulk_write([
+                UpdateOne(
+                    {'_id': result['_id']},
+                    {'$set': {'extracted_skills': as_skill_list(result['extracted_skills'])}},
+                )
+                for result in batch
+            ], ordered=False)
+            done += len(batch)
+            self.stdout.write(f"Normalized {done} results")
+
+        self.stdout.write(self.style.SUCCESS(f"Normalized the skills of {done} analysis results."))
@@ -0,0 +1,148 @@
+import collections
+import datetime
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from resume_analyzer.engine import SENTENCE_MODEL_NAME
+from resume_analyzer.jd_cache import jd_content_hash
+from resume_analyzer.rescoring import init_worker, score_batch, write_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-score every stored resume against one or more job descriptions in a "
+        "process pool, checkpointing progress so an interrupted run can resume."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--jd', action='append', dest='jd_ids', default=[],
+            help="Job description id to score against (repeatable; defaults to all).",
+        )
+        parser.add_argument('--batch-size', type=int, default=64)
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help="Scoring processes; each loads its own copy of the models.",
+        )
+        parser.add_argument(
+            '--run-id',
+            help="Checkpoint name (defaults to one derived from the model and job descriptions).",
+        )
+        parser.add_argument('--restart', action='store_true', help="Discard the checkpoint and start over.")
+
+    def handle(self, *args, **options):
+        db = settings.DB
+        job_descriptions = self._job_descriptions(db, options['jd_ids'])
+
+        # The default run id changes with the model or any JD's text, so a
+        # changed setup starts a fresh run instead of resuming a stale one
+        run_id = options['run_id'] or ':'.join(
+            [SENTENCE_MODEL_NAME] + [f"{jd['_id']}@{jd_content_hash(jd['content'])[:12]}" for jd in job_descriptions]
+        )
+        if options['restart']:
+            db.rescore_checkpoints.delete_one({'_id': run_id})
+        checkpoint = db.rescore_checkpoints.find_one({'_id': run_id}) or {}
+        if checkpoint.get('completed_at'):
+            self.stdout.write(f"Run {run_id} already completed; pass --restart to run it again.")
+            return
+
+        query = {'content': {'$exists': True}}
+        if checkpoint.get('last_resume_id'):
+            query['_id'] = {'$gt': checkpoint['last_resume_id']}
+            self.stdout.write(f"Resuming after {checkpoint['processed']} resumes.")
+        remaining = db.resumes.count_documents(query)
+        self.stdout.write(
+            f"Scoring {remaining} resumes against {len(job_descriptions)} job description(s) "
+            f"with {options['processes']} process(es)."
+        )
+
+        cursor = db.resumes.find(query, {'content': 1}).sort('_id', 1).batch_size(options['batch_size'])
+        processed = errors = 0
+        started = time.monotonic()
+
+        pool = ProcessPoolExecutor(
+            max_workers=options['processes'],
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker,
+            initargs=([jd['content'] for jd in job_descriptions],),
+        )
+        # Batches are written in submission order so the checkpoint only moves
+        # past resumes that are stored; at most two batches per process are in flight
+        pending = collections.deque()
+        try:
+            for batch in self._batches(cursor, options['batch_size']):
+                pending.append(pool.submit(score_batch, batch))
+                if len(pending) >= 2 * options['processes']:
+                    processed, errors = self._commit(db, run_id, pending.popleft().result(),
+                                                     job_descriptions, processed, errors, remaining, started)
+            while pending:
+                processed, errors = self._commit(db, run_id, pending.popleft().result(),
+                                                 job_descriptions, processed, errors, remaining, started)
+        except KeyboardInterrupt:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise CommandError(f"Interrupted after {processed} resumes; run again to resume from the checkpoint.")
+        pool.shutdown()
+
+        db.rescore_checkpoints.update_one(
+            {'_id': run_id},
+            {'$set': {'completed_at': datetime.datetime.now()}, '$setOnInsert': {'processed': 0}},
+            upsert=True,
+        )
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Rescored {processed} resumes in {elapsed:.1f}s ({processed / max(elapsed, 1e-9):.1f} resumes/sec), "
+            f"{errors} write error(s)."
+        ))
+
+    def _job_descriptions(self, db, jd_ids):
+        if not jd_ids:
+            job_descriptions = list(db.job_descriptions.find({}, {'content': 1, 'version': 1}).sort('_id', 1))
+            if not job_descriptions:
+                raise CommandError("There are no job descriptions to score against.")
+            return job_descriptions
+        try:
+            object_ids = [ObjectId(jd_id) for jd_id in jd_ids]
+        except InvalidId as e:
+            raise CommandError(str(e))
+        found = {
+            jd['_id']: jd
+            for jd in db.job_descriptions.find({'_id': {'$in': object_ids}}, {'content': 1, 'version': 1})
+        }
+        missing = [str(object_id) for object_id in object_ids if object_id not in found]
+        if missing:
+            raise CommandError(f"Job description(s) not found: {', '.join(missing)}")
+        return [found[object_id] for object_id in object_ids]
+
+    def _batches(self, cursor, batch_size):
+        batch = []
+        for resume in cursor:
+            batch.append(resume)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _commit(self, db, run_id, rows, job_descriptions, processed, errors, remaining, started):
+        now = datetime.datetime.now()
+        errors += write_batch(db, rows, job_descriptions, now)
+        processed += len(rows)
+        db.rescore_checkpoints.update_one(
+            {'_id': run_id},
+            {
+                '$set': {'last_resume_id': rows[-1]['resume_id'], 'updated_at': now},
+                '$inc': {'processed': len(rows)},
+                '$setOnInsert': {'started_at': now},
+            },
+            upsert=True,
+        )
+        rate = processed / max(time.monotonic() - started, 1e-9)
+        self.stdout.write(f"{processed}/{remaining} resumes, {rate:.1f} resumes/sec")
+        return processed, errors
@@ -0,0 +1,43 @@
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from resume_analyzer.engine import get_engine_pool
+from resume_analyzer.jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = "Process queued resume analysis jobs from the analysis_jobs collection."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=settings.ATS_ENGINE_POOL_SIZE,
+            help="Number of worker threads (defaults to ATS_ENGINE_POOL_SIZE).",
+        )
+
+    def handle(self, *args, **options):
+        if settings.ATS_ENGINE_PRELOAD:
+            self.stdout.write("Loading ATS engines...")
+            get_engine_pool().preload()
+
+        stop_event = threading.Event()
+        workers = [
+            threading.Thread(target=run_worker, args=(stop_event,), name=f'ats-analysis-worker-{i}', daemon=True)
+            for i in range(options['threads'])
+        ]
+        for worker in workers:
+            worker.start()
+
+        self.stdout.write(f"Analysis worker started with {len(workers)} thread(s). Press Ctrl+C to stop.")
+        try:
+            for worker in workers:
+                while worker.is_alive():
+                    worker.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping after the current jobs finish...")
+            stop_event.set()
+            for worker in workers:
+                worker.join()
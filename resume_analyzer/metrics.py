@@ -0,0 +1,141 @@
+"""
+Timing instrumentation for the analysis pipeline.
+
+``timed(stage, timings)`` brackets one stage: PDF extraction, each ATS call,
+each MongoDB write. Its duration is
+
+- added to the ``timings`` dict, if one is passed in. Analysis results store
+  this dict as ``timings``.
+- observed in the ``ats_stage_duration_seconds`` histogram.
+- logged at DEBUG through the ``resume_analyzer.metrics`` logger.
+
+``render_metrics()`` serves every registered metric in the Prometheus text
+exposition format for the ``/metrics`` endpoint. Metrics live in process
+memory, so each web or worker process exposes its own values.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds; pipeline stages range from sub-millisecond Mongo
+# writes to multi-second model calls on long resumes
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+
+
+def register(metric):
+    """Add ``metric`` (anything with a ``render()`` returning lines) to ``/metrics``."""
+    _registry.append(metric)
+    return metric
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Histogram:
+    """A Prometheus histogram with one label."""
+
+    def __init__(self, name, documentation, label, buckets=STAGE_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = {
+                    'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0,
+                }
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_value, series in sorted(self._series.items()):
+                label = f'{self.label}="{label_value}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets, series['counts']):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{{{label},le="{_format_value(bound)}"}} {cumulative}')
+                lines.append(f"{self.name}_sum{{{label}}} {_format_value(series['sum'])}")
+                lines.append(f"{self.name}_count{{{label}}} {series['count']}")
+        return lines
+
+
+STAGE_DURATION = register(Histogram(
+    'ats_stage_duration_seconds',
+    'Duration of each resume analysis pipeline stage.',
+    'stage',
+))
+
+
+_capture = threading.local()
+
+
+@contextmanager
+def capture_stages():
+    """
+    Collect every ``(stage, seconds)`` recorded by this thread inside the
+    block into the yielded list (used by the benchmarks).
+    """
+    previous = getattr(_capture, 'samples', None)
+    _capture.samples = samples = []
+    try:
+        yield samples
+    finally:
+        _capture.samples = previous
+
+
+def record(stage, seconds, timings=None):
+    """Record an already measured ``stage`` duration."""
+    STAGE_DURATION.observe(stage, seconds)
+    samples = getattr(_capture, 'samples', None)
+    if samples is not None:
+        samples.append((stage, seconds))
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+    logger.debug("Stage %s took %.1f ms", stage, seconds * 1000)
+
+
+def apportion(stage, seconds, timings):
+    """
+    Record one batched ``stage`` observation and charge each dict in the
+    ``timings`` list an equal share of it.
+    """
+    record(stage, seconds)
+    for resume_timings in timings or ():
+        resume_timings[stage] = resume_timings.get(stage, 0.0) + seconds / len(timings)
+
+
+@contextmanager
+def timed(stage, timings=None):
+    """Time the enclosed block as ``stage`` (failed attempts are recorded too)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start, timings)
+
+
+def render_metrics():
+    """Every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,232 @@
+"""
+Lazily created, fork-safe MongoDB clients.
+
+``settings.DB`` is a ``LazyDatabase``. Importing the settings (every
+``manage.py`` command, including ``migrate``) does not connect. The
+client is created on the first query in each process. Forked children
+(gunicorn workers, multiprocessing ``fork``) start with no client and
+create their own, because PyMongo clients must not be shared across a
+fork.
+
+Sync and async clients take their pool size, timeouts and wire
+compression from the ``ATS_MONGO_*`` settings through ``client_options``.
+A pool listener on every client tracks open, in-use and waiting
+connections per server. The counts are published on ``/metrics`` and as
+JSON at ``/mongo-pool/stats/``.
+"""
+import os
+import threading
+
+import pymongo
+from django.conf import settings
+from pymongo import monitoring
+from pymongo.read_preferences import make_read_preference, read_pref_mode_from_name
+
+from .metrics import Histogram, register
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+class PoolMetrics:
+    """Connection counts of every MongoDB connection pool in this process."""
+
+    def __init__(self):
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def listener(self, client):
+        """A pool listener reporting the pools of a ``client`` ('sync' or 'async')."""
+        return _PoolListener(self, client)
+
+    def _update(self, client, address, **changes):
+        with self._lock:
+            pool = self._pools.setdefault((client, address), {
+                'max_size': None, 'open': 0, 'in_use': 0, 'waiting': 0,
+                'checkouts': 0, 'checkout_failures': 0, 'cleared': 0,
+            })
+            for field, change in changes.items():
+                if field == 'max_size':
+                    pool[field] = change
+                else:
+                    pool[field] += change
+
+    def _remove(self, client, address):
+        with self._lock:
+            self._pools.pop((client, address), None)
+
+    def reset(self):
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def stats(self):
+        """One dict per pool: client, server address and connection counts."""
+        with self._lock:
+            return [
+                dict(pool, client=client, address=address)
+                for (client, address), pool in sorted(self._pools.items())
+            ]
+
+    def render(self):
+        stats = self.stats()
+        lines = []
+        for name, kind, documentation, field in (
+            ('ats_mongo_pool_in_use', 'gauge', 'Connections in use in each MongoDB pool.', 'in_use'),
+            ('ats_mongo_pool_open', 'gauge', 'Open connections in each MongoDB pool.', 'open'),
+            ('ats_mongo_pool_waiting', 'gauge', 'Operations waiting to check out a MongoDB connection.', 'waiting'),
+            ('ats_mongo_pool_max_size', 'gauge', 'maxPoolSize of each MongoDB pool.', 'max_size'),
+            ('ats_mongo_pool_checkouts_total', 'counter', 'Connections checked out of each MongoDB pool.', 'checkouts'),
+            ('ats_mongo_pool_checkout_failures_total', 'counter', 'Failed MongoDB connection checkouts.',
+             'checkout_failures'),
+            ('ats_mongo_pool_cleared_total', 'counter', 'Times each MongoDB pool was cleared after an error.',
+             'cleared'),
+        ):
+            lines.extend([f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"])
+            for pool in stats:
+                if pool[field] is not None:
+                    lines.append(f'{name}{{client="{pool["client"]}",address="{pool["address"]}"}} {pool[field]}')
+        return lines
+
+
+POOL_METRICS = register(PoolMetrics())
+
+CHECKOUT_DURATION = register(Histogram(
+    'ats_mongo_checkout_seconds',
+    'Time spent waiting to check out a MongoDB connection.',
+    'client',
+))
+
+
+def _address(address):
+    host, port = address
+    return f'{host}:{port}'
+
+
+class _PoolListener(monitoring.ConnectionPoolListener):
+    def __init__(self, metrics, client):
+        self.metrics = metrics
+        self.client = client
+
+    def _update(self, event, **changes):
+        self.metrics._update(self.client, _address(event.address), **changes)
+
+    def pool_created(self, event):
+        self._update(event, max_size=event.options.get('maxPoolSize'))
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._update(event, cleared=1)
+
+    def pool_closed(self, event):
+        self.metrics._remove(self.client, _address(event.address))
+
+    def connection_created(self, event):
+        self._update(event, open=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._update(event, open=-1)
+
+    def connection_check_out_started(self, event):
+        self._update(event, waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._update(event, waiting=-1, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._update(event, waiting=-1, in_use=1, checkouts=1)
+        duration = getattr(event, 'duration', None)
+        if duration is not None:
+            CHECKOUT_DURATION.observe(self.client, duration)
+
+    def connection_checked_in(self, event):
+        self._update(event, in_use=-1)
+
+
+def client_options(client='sync'):
+    """Keyword arguments for a ``MongoClient`` or ``AsyncMongoClient``."""
+    options = {
+        'appname': 'ATS',
+        'maxPoolSize': settings.ATS_MONGO_MAX_POOL_SIZE,
+        'minPoolSize': settings.ATS_MONGO_MIN_POOL_SIZE,
+        'connectTimeoutMS': settings.ATS_MONGO_CONNECT_TIMEOUT_MS,
+        'serverSelectionTimeoutMS': settings.ATS_MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        'event_listeners': [POOL_METRICS.listener(client)],
+    }
+    # Unset limits are left to the driver (no limit)
+    for option, value in (
+        ('maxIdleTimeMS', settings.ATS_MONGO_MAX_IDLE_TIME_MS),
+        ('waitQueueTimeoutMS', settings.ATS_MONGO_WAIT_QUEUE_TIMEOUT_MS),
+        ('socketTimeoutMS', settings.ATS_MONGO_SOCKET_TIMEOUT_MS),
+    ):
+        if value:
+            options[option] = value
+    if settings.ATS_MONGO_COMPRESSORS:
+        options['compressors'] = settings.ATS_MONGO_COMPRESSORS
+    return options
+
+
+def read_preference(name):
+    """A PyMongo read preference from its mode name, e.g. 'secondaryPreferred'."""
+    return make_read_preference(read_pref_mode_from_name(name), None)
+
+
+def get_client():
+    """This process's ``MongoClient``, created on first use."""
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = pymongo.MongoClient(settings.MONGO_URI, **client_options())
+                _client_pid = pid
+    return _client
+
+
+def get_db():
+    """The ATS database on this process's client."""
+    return get_client()[settings.MONGO_DB_NAME]
+
+
+def _after_fork_in_child():
+    # The parent's client, and possibly its held lock, are unusable here
+    global _client, _client_pid, _client_lock
+    _client = _client_pid = None
+    _client_lock = threading.Lock()
+    POOL_METRICS.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+class LazyDatabase:
+    """
+    Stands in for a ``pymongo.database.Database`` and resolves every
+    attribute on ``get_db()``, so it always refers to this process's client.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attr):
+        # Don't connect for copy/pickle protocol lookups
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+        return getattr(get_db(), attr)
+
+    def __getitem__(self, collection):
+        return get_db()[collection]
+
+    # Lets checks like GridFS's isinstance(database, Database) pass
+    @property
+    def __class__(self):
+        return get_db().__class__
+
+    def __repr__(self):
+        return f'<LazyDatabase {self.name!r}>'
@@ -0,0 +1,121 @@
+"""
+MongoDB aggregation pipelines for the read-heavy views.
+
+``analysis_results`` stores ``resume_id`` and ``job_description_id`` as
+strings, so the ``$lookup`` stages convert them to ObjectIds (malformed ids
+become null and simply don't match) and join on ``_id``. Each lookup is a
+primary-key fetch that only projects the fields the page displays.
+"""
+from bson.objectid import ObjectId
+
+
+def _to_object_id(field):
+    return {'$convert': {'input': field, 'to': 'objectId', 'onError': None, 'onNull': None}}
+
+
+def lookup_resume(fields):
+    """``$lookup`` stage joining the result's resume as ``resume``."""
+    return {'$lookup': {
+        'from': 'resumes',
+        'let': {'resume_id': _to_object_id('$resume_id')},
+        'pipeline': [
+            {'$match': {'$expr': {'$eq': ['$_id', '$$resume_id']}}},
+            {'$project': {field: 1 for field in fields}},
+        ],
+        'as': 'resume',
+    }}
+
+
+def lookup_job_description(fields):
+    """``$lookup`` stage joining the result's job description as ``job_description``."""
+    return {'$lookup': {
+        'from': 'job_descriptions',
+        'let': {'jd_id': _to_object_id('$job_description_id')},
+        'pipeline': [
+            {'$match': {'$expr': {'$eq': ['$_id', '$$jd_id']}}},
+            {'$project': {field: 1 for field in fields}},
+        ],
+        'as': 'job_description',
+    }}
+
+
+def encode_cursor(result):
+    """Opaque pagination cursor pointing just past ``result``."""
+    return f"{result['similarity_score']!r}:{result['_id']}"
+
+
+def decode_cursor(cursor):
+    """Inverse of ``encode_cursor``; returns ``(score, ObjectId)`` or None if invalid."""
+    try:
+        score, object_id = cursor.rsplit(':', 1)
+        return float(score), ObjectId(object_id)
+    except Exception:
+        return None
+
+
+def applicant_filter(job_description_id=None, min_score=None, max_score=None,
+                     created_from=None, created_before=None, skills=None, keywords=None):
+    """
+    ``$match`` document for the applicant list filters. ``skills`` must all
+    be present (normalized, see ``skills``); ``keywords`` is a ``$text``
+    search over the extracted skills and experience.
+    """
+    match = {}
+    if job_description_id:
+        match['job_description_id'] = job_description_id
+    if skills:
+        match['extracted_skills'] = {'$all': list(skills)}
+    score_range = {}
+    if min_score is not None:
+        score_range['$gte'] = min_score
+    if max_score is not None:
+        score_range['$lte'] = max_score
+    if score_range:
+        match['similarity_score'] = score_range
+    date_range = {}
+    if created_from is not None:
+        date_range['$gte'] = created_from
+    if created_before is not None:
+        date_range['$lt'] = created_before
+    if date_range:
+        match['created_at'] = date_range
+    if keywords:
+        match['$text'] = {'$search': keywords}
+    return match
+
+
+def applicants_page_pipeline(match, after=None, limit=50):
+    """
+    One page of applicants ordered by score (then ``_id``) descending.
+
+    Pagination is keyset-based: ``after`` is the decoded cursor of the last
+    row of the previous page, so each page is an index range scan on
+    ``(job_description_id, similarity_score, _id)`` or
+    ``(similarity_score, _id)`` no matter how deep it is. With a skills
+    filter the scan runs on the ``extracted_skills`` indexes instead.
+    """
+    match = dict(match)
+    if after is not None:
+        score, object_id = after
+        keyset = {'$or': [
+            {'similarity_score': {'$lt': score}},
+            {'similarity_score': score, '_id': {'$lt': object_id}},
+        ]}
+        match = {'$and': [match, keyset]} if match else keyset
+
+    return [
+        {'$match': match},
+        {'$sort': {'similarity_score': -1, '_id': -1}},
+        {'$limit': limit},
+        {'$project': {
+            'resume_id': 1,
+            'job_description_id': 1,
+            'similarity_score': 1,
+            'jd_version': 1,
+            'created_at': 1,
+        }},
+        lookup_resume(['filename']),
+        lookup_job_description(['title', 'version']),
+        {'$unwind': {'path': '$resume', 'preserveNullAndEmptyArrays': True}},
+        {'$unwind': {'path': '$job_description', 'preserveNullAndEmptyArrays': True}},
+    ]
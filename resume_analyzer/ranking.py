@@ -0,0 +1,186 @@
+"""
+Rank every stored resume against a job description in one vectorized pass.
+
+Each resume's sentence embedding (the vector the ATS score compares to the
+JD) is persisted on its ``db.resumes`` document when it is analyzed. A
+per-process ``ResumeMatrix`` holds all of them as one L2-normalized float32
+matrix. Cosine similarity against a JD is then a single matrix-vector
+product, followed by an ``argpartition`` top-k selection. At 100k resumes
+x 384 dimensions that is ~150 MB and a few milliseconds per query. The
+matrix is refreshed incrementally from ``embedded_at``, so only new
+embeddings are read from MongoDB. Resumes deleted from MongoDB are dropped
+from the matrix when they show up in a query's results.
+"""
+import datetime
+import threading
+
+import numpy as np
+
+from .engine import SENTENCE_MODEL_NAME
+from .storage import dump_vector, load_vector
+
+# Re-read embeddings written up to this long before the newest one already
+# loaded, to catch writes from other processes that landed out of order
+REFRESH_OVERLAP = datetime.timedelta(seconds=30)
+
+
+def embedding_fields(embedding):
+    """Fields to ``$set`` on a resume document to persist its embedding."""
+    return {
+        'embedding': dump_vector(embedding),
+        'embedding_model': SENTENCE_MODEL_NAME,
+        'embedded_at': datetime.datetime.now(),
+    }
+
+
+def load_embedding(value):
+    """Decode a persisted embedding into a float32 vector."""
+    return load_vector(value)
+
+
+def store_resume_embedding(db, resume_id, embedding):
+    """Persist a resume's embedding unless it already has one."""
+    db.resumes.update_one(
+        {'_id': resume_id, 'embedding': {'$exists': False}},
+        {'$set': embedding_fields(embedding)},
+    )
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def top_k(scores, k):
+    """Indices of the ``k`` highest ``scores``, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class ResumeMatrix:
+    """In-memory matrix of every stored resume embedding."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.ids = []
+        self._buffer = np.empty((0, 0), dtype=np.float32)
+        self._row_of = {}
+        self._embedded_at = {}
+        self._watermark = None
+        self._lock = threading.RLock()
+
+    def refresh(self):
+        """Load embeddings written since the last refresh."""
+        with self._lock:
+            query = {'embedding': {'$exists': True}, 'embedding_model': SENTENCE_MODEL_NAME}
+            if self._watermark is not None:
+                query['embedded_at'] = {'$gte': self._watermark - REFRESH_OVERLAP}
+
+            ids = []
+            vectors = []
+            cursor = self.collection.find(query, {'embedding': 1, 'embedded_at': 1}).batch_size(2000)
+            for doc in cursor:
+                # The overlap returns the newest embeddings every time; skip those already loaded
+                if self._embedded_at.get(doc['_id']) == doc['embedded_at']:
+                    continue
+                self._embedded_at[doc['_id']] = doc['embedded_at']
+                ids.append(doc['_id'])
+                vectors.append(load_embedding(doc['embedding']))
+                if self._watermark is None or doc['embedded_at'] > self._watermark:
+                    self._watermark = doc['embedded_at']
+
+            if ids:
+                self.add(ids, np.vstack(vectors))
+
+    def add(self, ids, vectors):
+        """
+        Insert or replace the embeddings of ``ids`` (one row of ``vectors``
+        each) and return the matrix rows that changed.
+        """
+        with self._lock:
+            vectors = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1))
+            count = len(self.ids)
+            rows = []
+            for resume_id in ids:
+                row = self._row_of.get(resume_id)
+                if row is None:
+                    row = self._row_of[resume_id] = len(self.ids)
+                    self.ids.append(resume_id)
+                rows.append(row)
+            self._reserve(count, len(self.ids), vectors.shape[1])
+            rows = np.asarray(rows, dtype=np.intp)
+            changed = (rows >= count) | np.any(self._buffer[rows] != vectors, axis=1)
+            rows = rows[changed]
+            self._buffer[rows] = vectors[changed]
+            return rows
+
+    def remove(self, ids):
+        """
+        Drop the embeddings of ``ids``. Returns the mask of rows kept, or
+        None if none of ``ids`` were loaded.
+        """
+        with self._lock:
+            rows = [self._row_of[resume_id] for resume_id in ids if resume_id in self._row_of]
+            if not rows:
+                return None
+            keep = np.ones(len(self.ids), dtype=bool)
+            keep[rows] = False
+            self._buffer = self.matrix[keep]
+            self.ids = [resume_id for resume_id, kept in zip(self.ids, keep) if kept]
+            self._row_of = {resume_id: row for row, resume_id in enumerate(self.ids)}
+            for resume_id in ids:
+                self._embedded_at.pop(resume_id, None)
+            return keep
+
+    def drop_deleted(self, ids):
+        """
+        Remove those of ``ids`` whose resume no longer exists in MongoDB;
+        returns True if any were removed.
+        """
+        existing = {doc['_id'] for doc in self.collection.find({'_id': {'$in': list(ids)}}, {'_id': 1})}
+        deleted = [resume_id for resume_id in ids if resume_id not in existing]
+        if deleted:
+            self.remove(deleted)
+        return bool(deleted)
+
+    def _reserve(self, count, needed, dims):
+        # Grow the buffer geometrically so appends are amortized O(rows added)
+        if needed > len(self._buffer) or self._buffer.shape[1] != dims:
+            buffer = np.empty((max(needed, 2 * len(self._buffer)), dims), dtype=np.float32)
+            if count:
+                buffer[:count] = self._buffer[:count]
+            self._buffer = buffer
+
+    @property
+    def matrix(self):
+        """The loaded embeddings, one normalized row per entry in ``ids``."""
+        return self._buffer[:len(self.ids)]
+
+    def rank(self, query_embedding, k):
+        """
+        ``(resume_id, similarity)`` pairs for the ``k`` resumes most similar
+        to ``query_embedding``, best first; similarity is cosine in [-1, 1].
+        """
+        with self._lock:
+            self.refresh()
+            query = _normalize(np.asarray(query_embedding, dtype=np.float32).reshape(-1))
+            # Deleted resumes are only noticed when they rank; drop them and rank again
+            while True:
+                if not self.ids:
+                    return []
+                scores = self.matrix @ query
+                ranked = [(self.ids[row], float(scores[row])) for row in top_k(scores, k)]
+                if not self.drop_deleted([resume_id for resume_id, _ in ranked]):
+                    return ranked
+
+
+def get_resume_matrix():
+    """
+    Return the process-wide resume matrix. It is the similarity index's
+    matrix, so exact ranking and ANN queries share one copy of the vectors.
+    """
+    from .ann import get_similarity_index
+    return get_similarity_index()
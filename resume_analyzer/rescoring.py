@@ -0,0 +1,256 @@
+"""
+Rescoring stored resumes against job descriptions.
+
+``rescore_job_description`` runs in the background after a job description
+is edited. It updates only that description's out-of-date results. Their
+resumes' stored embeddings are compared to the new JD embedding, so nothing
+is extracted or encoded again. Each result records the ``jd_version`` it
+was scored against, and a result is current when that matches the job
+description's ``version``, which every edit increments.
+
+The rest of this module is the offline ``manage.py rescore_resumes``:
+Worker processes each load one ``ATSEngine`` and the job descriptions'
+embeddings once (``init_worker``), then score batches of resumes: every
+resume is extracted and encoded once and compared to all job descriptions
+in a single similarity call (``score_batch``). The parent process writes
+each scored batch with one ``bulk_write`` per collection (``write_batch``),
+updating existing results in place so their ids and links stay valid.
+"""
+import datetime
+import logging
+
+import numpy as np
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from .dedup import content_hash
+from .engine import SENTENCE_MODEL_NAME, ATSEngine, get_engine_pool
+from .jd_cache import get_jd_feature_cache, jd_content_hash
+from .ranking import _normalize, embedding_fields, load_embedding
+from .result_cache import invalidate_analysis_results
+from .storage import load_text
+
+# Stale results rescored per bulk write
+RESCORE_BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+
+def is_current(result, job_description):
+    """Whether ``result`` was scored against ``job_description``'s current text."""
+    return result.get('jd_version', 0) == job_description.get('version', 0)
+
+
+def _compute_jd_features(content):
+    with get_engine_pool().checkout() as engine:
+        return engine.compute_jd_features(content)
+
+
+def _resume_embeddings(db, resume_ids):
+    """
+    Normalized stored embeddings of ``resume_ids`` keyed by id. Resumes
+    stored before embeddings were kept are encoded from their stored text
+    once and their embeddings saved. Only that encoding holds an engine.
+    """
+    vectors = {}
+    missing = []
+    for resume in db.resumes.find(
+        {'_id': {'$in': resume_ids}}, {'embedding': 1, 'embedding_model': 1, 'content': 1}
+    ):
+        if 'embedding' in resume and resume.get('embedding_model') == SENTENCE_MODEL_NAME:
+            vectors[resume['_id']] = _normalize(load_embedding(resume['embedding']))
+        elif resume.get('content'):
+            missing.append(resume)
+
+    if missing:
+        with get_engine_pool().checkout() as engine:
+            _, embeddings = engine.embed_many([load_text(resume['content']) for resume in missing])
+        db.resumes.bulk_write([
+            UpdateOne({'_id': resume['_id']}, {'$set': embedding_fields(embedding)})
+            for resume, embedding in zip(missing, embeddings)
+        ], ordered=False)
+        for resume, embedding in zip(missing, embeddings):
+            vectors[resume['_id']] = _normalize(load_embedding(embedding))
+    return vectors
+
+
+def _update_results(db, result_ids, updates):
+    try:
+        db.analysis_results.bulk_write(
+            [UpdateOne({'_id': result_id}, update) for result_id, update in zip(result_ids, updates)],
+            ordered=False,
+        )
+    except BulkWriteError as e:
+        # A result for the same resume at the new JD text already exists; it
+        # supersedes the stale one
+        duplicates = [
+            DeleteOne({'_id': result_ids[error['index']]})
+            for error in e.details['writeErrors'] if error['code'] == 11000
+        ]
+        if len(duplicates) < len(e.details['writeErrors']):
+            raise
+        db.analysis_results.bulk_write(duplicates, ordered=False)
+
+
+def rescore_job_description(db, job_description_id):
+    """
+    Bring every result for ``job_description_id`` up to its current version
+    and return how many were rescored. Safe to repeat: results that are
+    already current are not touched.
+    """
+    job_description = db.job_descriptions.find_one({'_id': job_description_id}, {'content': 1, 'version': 1})
+    if job_description is None:
+        return 0
+    version = job_description.get('version', 0)
+    jd_hash = jd_content_hash(job_description['content'])
+
+    # Engines are checked out only to encode, never across the scan and its writes
+    jd_features = get_jd_feature_cache().get_or_compute(job_description['content'], _compute_jd_features)
+    jd_embedding = _normalize(np.asarray(jd_features['embedding'], dtype=np.float32).reshape(-1))
+
+    rescored = 0
+    stale = db.analysis_results.find(
+        {'job_description_id': str(job_description_id), 'jd_version': {'$ne': version}},
+        {'resume_id': 1},
+    ).batch_size(RESCORE_BATCH_SIZE)
+    batch = []
+    for result in stale:
+        batch.append(result)
+        if len(batch) == RESCORE_BATCH_SIZE:
+            rescored += _rescore_batch(db, batch, jd_embedding, jd_hash, version)
+            batch = []
+    if batch:
+        rescored += _rescore_batch(db, batch, jd_embedding, jd_hash, version)
+
+    invalidate_analysis_results()
+    return rescored
+
+
+def _rescore_batch(db, results, jd_embedding, jd_hash, version):
+    resume_ids = []
+    for result in results:
+        try:
+            resume_ids.append(ObjectId(result['resume_id']))
+        except (InvalidId, TypeError):
+            resume_ids.append(None)
+    vectors = _resume_embeddings(db, [resume_id for resume_id in resume_ids if resume_id])
+
+    now = datetime.datetime.now()
+    result_ids, updates = [], []
+    for result, resume_id in zip(results, resume_ids):
+        # Results whose resume was deleted keep their old score
+        if resume_id not in vectors:
+            continue
+        result_ids.append(result['_id'])
+        updates.append({'$set': {
+            'similarity_score': float(vectors[resume_id] @ jd_embedding) * 100,
+            'jd_hash': jd_hash,
+            'jd_version': version,
+            'rescored_at': now,
+        }})
+    if result_ids:
+        _update_results(db, result_ids, updates)
+    return len(result_ids)
+
+
+_engine = None
+_jd_embeddings = None
+
+
+def init_worker(jd_contents):
+    """Process pool initializer: load the models and embed the job descriptions."""
+    global _engine, _jd_embeddings
+    _engine = ATSEngine()
+    _jd_embeddings = np.vstack([
+        np.asarray(_engine.compute_jd_features(content)['embedding'], dtype=np.float32)
+        for content in jd_contents
+    ])
+
+
+def score_batch(resumes):
+    """
+    Score ``resumes`` (dicts with ``_id`` and ``content``) against every job
+    description given to ``init_worker``. Returns one row per resume with
+    ``resume_id``, ``resume_hash``, ``experience``, ``skills``, ``embedding``
+    and ``scores`` (one 0-100 score per job description, in order).
+    """
+    contents = [load_text(resume['content']) for resume in resumes]
+    extracted, embeddings = _engine.embed_many(contents)
+    scores = np.asarray(_engine.model.similarity(embeddings, _jd_embeddings), dtype=np.float64) * 100
+    return [
+        {
+            'resume_id': resume['_id'],
+            'resume_hash': content_hash(content),
+            'experience': experience,
+            'skills': skills,
+            'embedding': np.asarray(embeddings[i], dtype=np.float32),
+            'scores': scores[i].tolist(),
+        }
+        for i, (resume, content, (experience, skills)) in enumerate(zip(resumes, contents, extracted))
+    ]
+
+
+def write_batch(db, rows, job_descriptions, now):
+    """
+    Store a scored batch. Each (resume, job description) pair ends up with
+    exactly one result: an existing one is updated in place (preferring the
+    one already keyed to the current JD text) and superseded duplicates are
+    removed; pairs never analyzed before are inserted. Returns the number
+    of write errors, which are logged rather than aborting the run.
+    """
+    jd_ids = [str(jd['_id']) for jd in job_descriptions]
+    jd_hashes = [jd_content_hash(jd['content']) for jd in job_descriptions]
+    jd_versions = [jd.get('version', 0) for jd in job_descriptions]
+
+    existing = {}
+    for result in db.analysis_results.find(
+        {'resume_id': {'$in': [str(row['resume_id']) for row in rows]}, 'job_description_id': {'$in': jd_ids}},
+        {'resume_id': 1, 'job_description_id': 1, 'jd_hash': 1},
+    ):
+        existing.setdefault((result['resume_id'], result['job_description_id']), []).append(result)
+
+    result_ops = []
+    for row in rows:
+        resume_id = str(row['resume_id'])
+        for jd_id, jd_hash, jd_version, score in zip(jd_ids, jd_hashes, jd_versions, row['scores']):
+            fields = {
+                'resume_id': resume_id,
+                'job_description_id': jd_id,
+                'resume_hash': row['resume_hash'],
+                'jd_hash': jd_hash,
+                'jd_version': jd_version,
+                'similarity_score': score,
+                'extracted_skills': row['skills'],
+                'extracted_experience': row['experience'],
+                'scored_with': SENTENCE_MODEL_NAME,
+                'rescored_at': now,
+            }
+            # The result already at the current JD text owns the unique key; keep it
+            current = sorted(existing.get((resume_id, jd_id), []), key=lambda r: r.get('jd_hash') != jd_hash)
+            if current:
+                result_ops.append(UpdateOne({'_id': current[0]['_id']}, {'$set': fields}))
+                result_ops.extend(DeleteOne({'_id': result['_id']}) for result in current[1:])
+            else:
+                result_ops.append(UpdateOne(
+                    {'resume_hash': row['resume_hash'], 'jd_hash': jd_hash, 'job_description_id': jd_id},
+                    {'$set': fields, '$setOnInsert': {'created_at': now}},
+                    upsert=True,
+                ))
+
+    errors = 0
+    for collection, ops in (
+        (db.analysis_results, result_ops),
+        (db.resumes, [
+            UpdateOne({'_id': row['resume_id']}, {'$set': embedding_fields(row['embedding'])})
+            for row in rows
+        ]),
+    ):
+        try:
+            collection.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            errors += len(e.details['writeErrors'])
+            logger.warning("%s write errors rescoring into %s: %s", len(e.details['writeErrors']),
+                           collection.name, e.details['writeErrors'][0]['errmsg'])
+    return errors
@@ -0,0 +1,72 @@
+"""
+Read-through cache for analysis result pages.
+
+A result page is loaded with one aggregation: the result, plus the resume
+and job description joined by ``$lookup`` with only the displayed fields
+projected. The joined document is then kept in Django's cache for
+``ATS_RESULT_CACHE_TTL`` seconds. Results do not change once written, but
+the page also shows the job description's title. Editing or deleting a job
+description therefore bumps a generation number that is part of every
+cache key, which drops all cached pages at once. Rescoring rewrites
+results in place and bumps the same generation.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .queries import lookup_job_description, lookup_resume
+
+GENERATION_KEY = 'analysis_result:generation'
+
+# Fields of each document the result page renders
+RESULT_FIELDS = ['resume_id', 'job_description_id', 'similarity_score',
+                 'extracted_skills', 'extracted_experience', 'created_at']
+RESUME_FIELDS = ['filename']
+JOB_DESCRIPTION_FIELDS = ['title']
+
+
+def analysis_result_pipeline(object_id):
+    """One result with its resume and job description joined in."""
+    return [
+        {'$match': {'_id': object_id}},
+        {'$project': {field: 1 for field in RESULT_FIELDS}},
+        lookup_resume(RESUME_FIELDS),
+        lookup_job_description(JOB_DESCRIPTION_FIELDS),
+    ]
+
+
+def _key(generation, result_id):
+    return f'analysis_result:{generation}:{result_id}'
+
+
+async def get_analysis_result(adb, object_id):
+    """
+    The result with ``object_id`` as ``{'result', 'resume',
+    'job_description'}`` (resume and job description are None if they were
+    deleted), or None if there is no such result. Misses are not cached.
+    """
+    generation = await cache.aget(GENERATION_KEY, 0)
+    key = _key(generation, object_id)
+    page = await cache.aget(key)
+    if page is not None:
+        return page
+
+    cursor = await adb.analysis_results.aggregate(analysis_result_pipeline(object_id))
+    documents = await cursor.to_list(1)
+    if not documents:
+        return None
+
+    result = documents[0]
+    page = {
+        'result': result,
+        'resume': (result.pop('resume') or [None])[0],
+        'job_description': (result.pop('job_description') or [None])[0],
+    }
+    if page['resume'] is not None and page['job_description'] is not None:
+        await cache.aset(key, page, settings.ATS_RESULT_CACHE_TTL)
+    return page
+
+
+def invalidate_analysis_results():
+    """Drop every cached result page, e.g. after a job description changes."""
+    cache.add(GENERATION_KEY, 0, None)
+    cache.incr(GENERATION_KEY)
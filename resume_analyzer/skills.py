@@ -0,0 +1,47 @@
+"""
+Normalized skill lists.
+
+Analysis results store ``extracted_skills`` as an array of normalized
+skills: lowercased, with whitespace collapsed and duplicates dropped, in
+extraction order. A multikey index then serves "has all of these skills"
+searches with ``$all``. Results written before that hold one space-joined
+string, and ``as_skill_list`` reads both forms (``manage.py
+normalize_skills`` converts the old ones).
+"""
+import re
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_skill(skill):
+    """Canonical form of one skill, e.g. ``'  Machine   Learning'`` -> ``'machine learning'``."""
+    return _WHITESPACE.sub(' ', str(skill)).strip().lower()
+
+
+def normalize_skills(skills):
+    """Normalized, de-duplicated skills in their original order."""
+    normalized = []
+    seen = set()
+    for skill in skills:
+        skill = normalize_skill(skill)
+        if skill and skill not in seen:
+            seen.add(skill)
+            normalized.append(skill)
+    return normalized
+
+
+def as_skill_list(value):
+    """
+    ``extracted_skills`` as a list. Legacy space-joined strings are split
+    on whitespace, since the original skill boundaries were not kept.
+    """
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return normalize_skills(value.split())
+    return list(value)
+
+
+def parse_skill_query(text):
+    """Skills from a comma-separated search box entry."""
+    return normalize_skills((text or '').split(','))
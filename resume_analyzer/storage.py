@@ -0,0 +1,91 @@
+"""
+Compact MongoDB encodings for resume text and embedding vectors.
+
+Resume text can be stored compressed (``ATS_RESUME_TEXT_COMPRESSION``:
+``none``, ``zlib`` or ``zstd``; zstd needs the optional ``zstandard``
+package). Compressed text is a BSON binary in the same ``content`` field.
+The codec is recognized from the zstd frame magic, so documents written
+with either codec, or as plain strings before compression was enabled,
+all decode with ``load_text``.
+
+Embeddings are packed little-endian float32 or float16
+(``ATS_EMBEDDING_DTYPE``) in a BSON binary instead of an array of doubles.
+That is 4x or 8x smaller on disk and on the wire. The user-defined binary
+subtype records the dtype. ``load_vector`` decodes float32 as a read-only
+view of the BSON bytes, without copying them; float16 is widened to
+float32 once.
+"""
+import zlib
+
+import numpy as np
+from bson.binary import Binary
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+TEXT_CODECS = ('none', 'zlib', 'zstd')
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 9
+# Shorter texts are stored as strings; compression would save next to nothing
+MIN_COMPRESSED_LENGTH = 512
+
+VECTOR_SUBTYPES = {'float32': 128, 'float16': 129}
+VECTOR_DTYPES = {subtype: np.dtype(name).newbyteorder('<') for name, subtype in VECTOR_SUBTYPES.items()}
+
+
+def _text_codec():
+    codec = getattr(settings, 'ATS_RESUME_TEXT_COMPRESSION', 'none')
+    if codec not in TEXT_CODECS:
+        raise ImproperlyConfigured(f"ATS_RESUME_TEXT_COMPRESSION must be one of {', '.join(TEXT_CODECS)}.")
+    if codec == 'zstd' and zstandard is None:
+        raise ImproperlyConfigured("ATS_RESUME_TEXT_COMPRESSION = 'zstd' requires the zstandard package.")
+    return codec
+
+
+def dump_text(text):
+    """Encode resume text for storage with the configured codec."""
+    codec = _text_codec()
+    if codec == 'none' or len(text) < MIN_COMPRESSED_LENGTH:
+        return text
+    data = text.encode('utf-8')
+    if codec == 'zstd':
+        return Binary(zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data))
+    return Binary(zlib.compress(data, ZLIB_LEVEL))
+
+
+def load_text(value):
+    """Decode resume text stored by ``dump_text`` (or as a plain string)."""
+    if value is None or isinstance(value, str):
+        return value
+    data = bytes(value)
+    if data.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise ImproperlyConfigured("Decoding zstd-compressed resume text requires the zstandard package.")
+        return zstandard.ZstdDecompressor().decompress(data).decode('utf-8')
+    return zlib.decompress(data).decode('utf-8')
+
+
+def dump_vector(vector):
+    """Pack a vector as a BSON binary in the configured ``ATS_EMBEDDING_DTYPE``."""
+    name = getattr(settings, 'ATS_EMBEDDING_DTYPE', 'float32')
+    if name not in VECTOR_SUBTYPES:
+        raise ImproperlyConfigured(f"ATS_EMBEDDING_DTYPE must be one of {', '.join(VECTOR_SUBTYPES)}.")
+    subtype = VECTOR_SUBTYPES[name]
+    packed = np.ascontiguousarray(np.asarray(vector).reshape(-1), dtype=VECTOR_DTYPES[subtype])
+    return Binary(packed.tobytes(), subtype)
+
+
+def load_vector(value):
+    """
+    Decode a vector stored by ``dump_vector`` (or as a list of numbers) into
+    a float32 array. Packed float32 vectors come back as read-only views.
+    """
+    if isinstance(value, Binary) and value.subtype in VECTOR_DTYPES:
+        vector = np.frombuffer(value, dtype=VECTOR_DTYPES[value.subtype])
+        return vector.astype(np.float32, copy=False)
+    return np.asarray(value, dtype=np.float32)
@@ -1,3 +1,446 @@
-from django.test import TestCase
+"""
+Unit tests for the concurrency and storage code. MongoDB is replaced by an
+in-memory mongomock database, so no test needs a server.
+"""
+import datetime
+import operator
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+import mongomock
+import numpy as np
+from bson.objectid import ObjectId
+from bson.binary import Binary
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from . import admission, jobs, storage
+from .ann import SimilarityIndex
+from .extraction import ExtractionLimitExceeded, ExtractionPool
+from .queries import applicants_page_pipeline, decode_cursor, encode_cursor
+from .ranking import embedding_fields
+
+
+def _mongo():
+    """A fresh in-memory database standing in for ``settings.DB``."""
+    return mongomock.MongoClient().ATS
+
+
+class JobQueueTests(SimpleTestCase):
+    """Claiming, leases, heartbeats and retries of ``analysis_jobs``."""
+
+    def setUp(self):
+        self.db = _mongo()
+        settings = override_settings(
+            DB=self.db, ATS_JOB_WORKERS=0, ATS_JOB_LEASE_SECONDS=60, ATS_JOB_MAX_ATTEMPTS=3,
+            ATS_JOB_RETRY_BACKOFF=5,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def _insert(self, **fields):
+        job = jobs._new_job(kind=jobs.RESCORE, filename=None, file_id=None, job_description_id=None, **fields)
+        return self.db.analysis_jobs.insert_one(job).inserted_id
+
+    def _expired(self):
+        return jobs._now() - datetime.timedelta(seconds=1)
+
+    def test_claim_takes_queued_job_with_a_lease(self):
+        job_id = self._insert()
+        job = jobs._claim()
+        self.assertEqual(job['_id'], job_id)
+        self.assertEqual(job['status'], jobs.RUNNING)
+        self.assertEqual(job['attempts'], 1)
+        self.assertGreater(job['lease_expires_at'], jobs._now())
+        self.assertIsNone(jobs._claim())
+
+    def test_expired_lease_is_reclaimed(self):
+        job_id = self._insert(status=jobs.RUNNING, attempts=1, lease_expires_at=self._expired())
+        job = jobs._claim()
+        self.assertEqual(job['_id'], job_id)
+        self.assertEqual(job['attempts'], 2)
+        self.assertGreater(job['lease_expires_at'], jobs._now())
+
+    def test_live_lease_is_not_reclaimed(self):
+        self._insert(status=jobs.RUNNING, attempts=1, lease_expires_at=jobs._now() + datetime.timedelta(seconds=60))
+        self.assertIsNone(jobs._claim())
+
+    def test_expired_lease_on_last_attempt_fails_the_job(self):
+        job_id = self._insert(status=jobs.RUNNING, attempts=3, lease_expires_at=self._expired())
+        with self.assertLogs('resume_analyzer.jobs', 'ERROR'):
+            self.assertIsNone(jobs._claim())
+        job = self.db.analysis_jobs.find_one({'_id': job_id})
+        self.assertEqual(job['status'], jobs.FAILED)
+        self.assertIsNone(job['lease_expires_at'])
+        self.assertIsNotNone(job['error'])
+
+    def test_worker_that_lost_its_lease_cannot_write(self):
+        job_id = self._insert()
+        stale = jobs._claim()
+        self.db.analysis_jobs.update_one({'_id': job_id}, {'$set': {'lease_expires_at': self._expired()}})
+        current = jobs._claim()
+        self.assertEqual(current['attempts'], 2)
+
+        jobs._set_stage(stale, 'saving')
+        with mock.patch.object(jobs, '_run_rescore', return_value=None):
+            jobs.process_job(stale)
+        job = self.db.analysis_jobs.find_one({'_id': job_id})
+        self.assertEqual(job['status'], jobs.RUNNING)
+        self.assertEqual(job['stage'], jobs.QUEUED)
+
+        with mock.patch.object(jobs, '_run_rescore', return_value=None):
+            jobs.process_job(current)
+        self.assertEqual(self.db.analysis_jobs.find_one({'_id': job_id})['status'], jobs.COMPLETED)
+
+    def test_heartbeat_extends_the_lease(self):
+        self._insert()
+        with override_settings(ATS_JOB_LEASE_SECONDS=0.3):
+            job = jobs._claim()
+            with jobs._heartbeat(job):
+                time.sleep(0.5)
+                # A job outliving its first lease is not claimed again
+                self.assertIsNone(jobs._claim())
+        lease_expires_at = self.db.analysis_jobs.find_one({'_id': job['_id']})['lease_expires_at']
+        self.assertGreater(lease_expires_at, job['lease_expires_at'])
+
+    def test_failure_is_retried_with_backoff_up_to_max_attempts(self):
+        job_id = self._insert()
+        with mock.patch.object(jobs, '_run_rescore', side_effect=RuntimeError("boom")), \
+                self.assertLogs('resume_analyzer.jobs', 'ERROR'):
+            for attempt in range(1, 4):
+                self.db.analysis_jobs.update_one({'_id': job_id}, {'$set': {'next_attempt_at': jobs._now()}})
+                job = jobs._claim()
+                self.assertEqual(job['attempts'], attempt)
+                jobs.process_job(job)
+                job = self.db.analysis_jobs.find_one({'_id': job_id})
+                if attempt < 3:
+                    self.assertEqual(job['status'], jobs.RETRYING)
+                    backoff = (job['next_attempt_at'] - job['updated_at']).total_seconds()
+                    self.assertAlmostEqual(backoff, 5 * 2 ** (attempt - 1), delta=0.1)
+                    self.assertIsNone(jobs._claim())
+        self.assertEqual(job['status'], jobs.FAILED)
+        self.assertEqual(job['error'], "boom")
+
+
+class ExtractionPoolTests(SimpleTestCase):
+    """Deadlines and worker replacement in ``ExtractionPool``."""
+
+    def setUp(self):
+        self.pool = ExtractionPool(1)
+        self.addCleanup(self.pool.shutdown)
+
+    def _deadline(self, seconds):
+        return time.monotonic() + seconds
+
+    def test_worker_is_reused(self):
+        pid = self.pool.run(os.getpid, (), self._deadline(60))
+        self.assertNotEqual(pid, os.getpid())
+        self.assertEqual(self.pool.run(os.getpid, (), self._deadline(60)), pid)
+
+    def test_exception_is_raised_and_worker_kept(self):
+        pid = self.pool.run(os.getpid, (), self._deadline(60))
+        with self.assertRaises(ZeroDivisionError):
+            self.pool.run(operator.truediv, (1, 0), self._deadline(60))
+        self.assertEqual(self.pool.run(os.getpid, (), self._deadline(60)), pid)
+
+    def test_worker_is_killed_at_its_deadline(self):
+        pid = self.pool.run(os.getpid, (), self._deadline(60))
+        start = time.monotonic()
+        with self.assertRaises(ExtractionLimitExceeded):
+            self.pool.run(time.sleep, (60,), self._deadline(0.5))
+        self.assertLess(time.monotonic() - start, 5)
+        with self.assertRaises(ProcessLookupError):
+            os.kill(pid, 0)
+        self.assertNotEqual(self.pool.run(os.getpid, (), self._deadline(60)), pid)
+
+    def test_wait_for_a_busy_worker_counts_against_the_deadline(self):
+        self.pool.run(os.getpid, (), self._deadline(60))
+        self.pool._slots.acquire()
+        try:
+            with self.assertRaises(ExtractionLimitExceeded):
+                self.pool.run(os.getpid, (), self._deadline(0.2))
+        finally:
+            self.pool._slots.release()
+
+
+class SimilarityIndexTests(SimpleTestCase):
+    """Search, refresh, save and load of ``SimilarityIndex``."""
+
+    def setUp(self):
+        self.resumes = _mongo().resumes
+        self.rng = np.random.default_rng(0)
+        self.vectors = {}
+        for _ in range(200):
+            self._store(self.rng.normal(size=8))
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'index.npz')
+
+    def _store(self, vector, resumes=None):
+        resume_id = ObjectId()
+        (resumes or self.resumes).insert_one({'_id': resume_id, **embedding_fields(np.asarray(vector, dtype=np.float32))})
+        self.vectors[resume_id] = vector
+        return resume_id
+
+    def _index(self, resumes=None, **kwargs):
+        return SimilarityIndex(resumes or self.resumes, path=self.path, **{'min_train_size': 50, 'nprobe': 100, **kwargs})
+
+    def _exact(self, query, k):
+        ids = list(self.vectors)
+        matrix = np.array([self.vectors[resume_id] for resume_id in ids])
+        scores = matrix @ query / np.linalg.norm(matrix, axis=1)
+        return [ids[i] for i in np.argsort(-scores)[:k]]
+
+    def test_search_matches_exact_ranking(self):
+        query = self.rng.normal(size=8)
+        for min_train_size in (1000, 50):
+            with self.subTest(min_train_size=min_train_size):
+                index = self._index(min_train_size=min_train_size)
+                results = index.search(query, 5)
+                self.assertEqual(index.centroids is None, min_train_size == 1000)
+                self.assertEqual([resume_id for resume_id, _ in results], self._exact(query, 5))
+
+    def test_search_leaves_out_excluded_and_deleted_resumes(self):
+        index = self._index()
+        query = self.rng.normal(size=8)
+        best, second = self._exact(query, 2)
+        self.assertNotIn(best, [resume_id for resume_id, _ in index.search(query, 5, exclude=best)])
+        self.resumes.delete_one({'_id': best})
+        results = index.search(query, 5)
+        self.assertEqual(results[0][0], second)
+        self.assertNotIn(best, index.ids)
+
+    def test_refresh_adds_new_embeddings_only(self):
+        index = self._index()
+        index.search(self.rng.normal(size=8), 5)
+        index.save()
+        index.search(self.rng.normal(size=8), 5)
+        self.assertFalse(index._dirty)
+        self.assertIsNotNone(index._lists)
+
+        resume_id = self._store(self.rng.normal(size=8))
+        index.search(self.rng.normal(size=8), 5)
+        self.assertIn(resume_id, index.ids)
+        self.assertTrue(index._dirty)
+
+    def test_save_and_load_round_trip(self):
+        index = self._index()
+        query = self.rng.normal(size=8)
+        results = index.search(query, 5)
+        index.save()
+
+        loaded = self._index()
+        self.assertTrue(loaded.load())
+        self.assertEqual(loaded.ids, index.ids)
+        np.testing.assert_array_equal(loaded.centroids, index.centroids)
+        self.assertEqual(loaded.search(query, 5), results)
+        self.assertFalse(loaded._dirty)
+
+    def test_load_ignores_index_of_another_dimension(self):
+        index = self._index()
+        index.search(self.rng.normal(size=8), 5)
+        index.save()
+
+        resumes = _mongo().resumes
+        self.vectors = {}
+        for _ in range(20):
+            self._store(self.rng.normal(size=16), resumes)
+        stale = self._index(resumes)
+        with self.assertLogs('resume_analyzer.ann', 'WARNING'):
+            self.assertFalse(stale.load())
+        query = self.rng.normal(size=16)
+        self.assertEqual([resume_id for resume_id, _ in stale.search(query, 3)], self._exact(query, 3))
+
+
+class AdmissionControllerTests(SimpleTestCase):
+    """Slots and the wait queue of ``AdmissionController``."""
+
+    def test_waiter_gets_a_released_slot(self):
+        controller = admission.AdmissionController(capacity=2, max_waiting=1, timeout=5)
+        self.assertEqual(controller.acquire('upload', 2), 2)
+        admitted = []
+        waiter = threading.Thread(target=lambda: admitted.append(controller.acquire('upload', 1)))
+        waiter.start()
+        while controller.stats()['waiting'] == 0:
+            time.sleep(0.01)
+        controller.release(2, 0.5)
+        waiter.join()
+        self.assertEqual(admitted, [1])
+        self.assertEqual(controller.stats()['in_use'], 1)
+
+    def test_full_wait_queue_is_rejected(self):
+        controller = admission.AdmissionController(capacity=1, max_waiting=0, timeout=5)
+        controller.acquire('upload')
+        with self.assertRaises(admission.Rejected) as rejected:
+            controller.acquire('upload')
+        self.assertEqual(rejected.exception.reason, admission.QUEUE_FULL)
+        self.assertGreaterEqual(rejected.exception.retry_after, 1)
+
+    def test_wait_times_out(self):
+        controller = admission.AdmissionController(capacity=1, max_waiting=1, timeout=0.1)
+        controller.acquire('upload')
+        start = time.monotonic()
+        with self.assertRaises(admission.Rejected) as rejected:
+            controller.acquire('upload')
+        self.assertEqual(rejected.exception.reason, admission.QUEUE_TIMEOUT)
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+        self.assertEqual(controller.stats()['waiting'], 0)
+
+    def test_units_are_capped_at_capacity(self):
+        controller = admission.AdmissionController(capacity=2, max_waiting=0, timeout=0)
+        self.assertEqual(controller.acquire('bulk', 10), 2)
+        controller.release(2, 1.0)
+        self.assertEqual(controller.stats()['in_use'], 0)
+
+
+@override_settings(ATS_UPLOAD_RATE_LIMIT=3, ATS_UPLOAD_RATE_WINDOW=60)
+class RateLimitTests(SimpleTestCase):
+    """Per-client budgets of ``check_rate``."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_budget_is_per_client_and_endpoint(self):
+        admission.check_rate('upload', '10.0.0.1', 2)
+        admission.check_rate('upload', '10.0.0.1', 1)
+        with self.assertRaises(admission.Rejected) as rejected:
+            admission.check_rate('upload', '10.0.0.1', 1)
+        self.assertEqual(rejected.exception.reason, admission.RATE_LIMITED)
+        self.assertTrue(1 <= rejected.exception.retry_after <= 60)
+        admission.check_rate('upload', '10.0.0.2', 3)
+        admission.check_rate('bulk', '10.0.0.1', 3)
+
+    def test_request_over_the_whole_budget_fits_an_idle_window(self):
+        admission.check_rate('upload', '10.0.0.1', 10)
+        with self.assertRaises(admission.Rejected):
+            admission.check_rate('upload', '10.0.0.1', 1)
+
+
+@admission.admission_controlled('test_upload', 'ATS_UPLOAD_MAX_BYTES')
+def _upload_view(request):
+    return HttpResponse()
+
+
+@override_settings(ATS_UPLOAD_RATE_LIMIT=0, ATS_UPLOAD_MAX_BYTES=1024)
+class AdmissionMiddlewareTests(SimpleTestCase):
+    """Checks ``AdmissionMiddleware`` makes before the body is read."""
+
+    def setUp(self):
+        self.middleware = admission.AdmissionMiddleware(_upload_view)
+
+    def _post(self, size):
+        return RequestFactory().post('/upload/', data=b'x' * size, content_type='application/octet-stream')
+
+    def test_admitted_request_holds_its_slot_until_the_response(self):
+        controller = admission.get_admission_controller()
+        request = self._post(100)
+        self.assertIsNone(self.middleware.process_view(request, _upload_view, (), {}))
+        self.assertEqual(controller.stats()['in_use'], request._admission[0])
+        self.middleware._release(request)
+        self.assertEqual(controller.stats()['in_use'], 0)
+
+    def test_oversized_request_is_rejected(self):
+        request = self._post(1024 + admission.FORM_OVERHEAD_BYTES + 1)
+        with self.assertLogs('resume_analyzer.admission', 'WARNING'):
+            response = self.middleware.process_view(request, _upload_view, (), {})
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(hasattr(request, '_admission'))
+
+    def test_request_without_content_length_is_rejected(self):
+        request = self._post(1)
+        del request.META['CONTENT_LENGTH']
+        with self.assertLogs('resume_analyzer.admission', 'WARNING'):
+            response = self.middleware.process_view(request, _upload_view, (), {})
+        self.assertEqual(response.status_code, 411)
+
+
+class KeysetCursorTests(SimpleTestCase):
+    """Applicant list cursors and the pages they select."""
+
+    def test_cursor_round_trip(self):
+        object_id = ObjectId()
+        for score in (87.5, 0.1 + 0.2, 100.0, 0.0, -1e-9):
+            with self.subTest(score=score):
+                self.assertEqual(decode_cursor(encode_cursor({'similarity_score': score, '_id': object_id})),
+                                 (score, object_id))
+
+    def test_invalid_cursor_decodes_to_none(self):
+        for cursor in ('', 'abc', '1.5', '1.5:not-an-id', f'x:{ObjectId()}'):
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(decode_cursor(cursor))
+
+    def test_pages_cover_every_result_once(self):
+        results = _mongo().analysis_results
+        # Repeated scores make the _id tie-break matter
+        results.insert_many([{'similarity_score': float(score % 7)} for score in range(40)])
+        seen = []
+        after = None
+        while True:
+            # The page itself, without the resume and job description lookups
+            page = list(results.aggregate(applicants_page_pipeline({}, after=after, limit=6)[:3]))
+            if not page:
+                break
+            seen.extend(page)
+            after = decode_cursor(encode_cursor(page[-1]))
+        expected = sorted(results.find(), key=lambda r: (r['similarity_score'], r['_id']), reverse=True)
+        self.assertEqual([r['_id'] for r in seen], [r['_id'] for r in expected])
+
+
+class StorageCodecTests(SimpleTestCase):
+    """Round trips through the compact text and vector encodings."""
+
+    text = "Experience\nBuilt Django services for resume screening. " * 40
+
+    def test_text_round_trip(self):
+        codecs = ['none', 'zlib'] + (['zstd'] if storage.zstandard is not None else [])
+        for codec in codecs:
+            with self.subTest(codec=codec), override_settings(ATS_RESUME_TEXT_COMPRESSION=codec):
+                stored = storage.dump_text(self.text)
+                self.assertIsInstance(stored, str if codec == 'none' else Binary)
+                self.assertEqual(storage.load_text(stored), self.text)
+
+    def test_short_and_legacy_text_stay_strings(self):
+        with override_settings(ATS_RESUME_TEXT_COMPRESSION='zlib'):
+            self.assertEqual(storage.dump_text("python, django"), "python, django")
+        self.assertEqual(storage.load_text("stored before compression"), "stored before compression")
+        self.assertIsNone(storage.load_text(None))
+
+    def test_text_written_with_either_codec_decodes_under_the_other(self):
+        with override_settings(ATS_RESUME_TEXT_COMPRESSION='zlib'):
+            stored = storage.dump_text(self.text)
+        with override_settings(ATS_RESUME_TEXT_COMPRESSION='none'):
+            self.assertEqual(storage.load_text(stored), self.text)
+
+    def test_unknown_text_codec_is_rejected(self):
+        with override_settings(ATS_RESUME_TEXT_COMPRESSION='lz4'), self.assertRaises(ImproperlyConfigured):
+            storage.dump_text(self.text)
+
+    def test_vector_round_trip(self):
+        vector = np.random.default_rng(0).normal(size=384).astype(np.float32)
+        with override_settings(ATS_EMBEDDING_DTYPE='float32'):
+            stored = storage.dump_vector(vector)
+        self.assertEqual(len(stored), 384 * 4)
+        loaded = storage.load_vector(stored)
+        self.assertEqual(loaded.dtype, np.float32)
+        np.testing.assert_array_equal(loaded, vector)
+
+        with override_settings(ATS_EMBEDDING_DTYPE='float16'):
+            stored = storage.dump_vector(vector)
+        self.assertEqual(len(stored), 384 * 2)
+        loaded = storage.load_vector(stored)
+        self.assertEqual(loaded.dtype, np.float32)
+        np.testing.assert_allclose(loaded, vector, rtol=1e-3, atol=1e-3)
+
+    def test_legacy_vector_lists_decode(self):
+        loaded = storage.load_vector([0.5, -1.0, 2.0])
+        self.assertEqual(loaded.dtype, np.float32)
+        np.testing.assert_array_equal(loaded, [0.5, -1.0, 2.0])
+
+    def test_unknown_vector_dtype_is_rejected(self):
+        with override_settings(ATS_EMBEDDING_DTYPE='float64'), self.assertRaises(ImproperlyConfigured):
+            storage.dump_vector([1.0])
@@ -8,9 +8,19 @@ urlpatterns = [
     path('job-descriptions/', views.manage_job_descriptions, name='manage_job_descriptions'),
     path('job-descriptions/delete/<str:jd_id>/', views.delete_job_description, name='delete_job_description'),
     path('job-descriptions/edit/<str:jd_id>/', views.edit_job_description, name='edit_job_description'),
+    path('job-descriptions/<str:jd_id>/rank/', views.rank_candidates, name='rank_candidates'),
     path('upload-resume/', views.upload_resume, name='upload_resume'),
+    path('upload-resume/bulk/', views.bulk_upload_resumes, name='bulk_upload_resumes'),
+    path('analysis-jobs/<str:job_id>/', views.analysis_job, name='analysis_job'),
+    path('analysis-jobs/<str:job_id>/status/', views.analysis_job_status, name='analysis_job_status'),
     path('analysis-result/<str:result_id>/', views.analysis_result, name='analysis_result'),
+    path('similar-candidates/', views.similar_candidates, name='similar_candidates'),
     path('applicants/', views.view_applicants, name='view_applicants'),  # Add this new URL pattern
+    path('applicants/export/', views.export_applicants, name='export_applicants'),
+    path('metrics', views.metrics, name='metrics'),
+    path('engine-pool/stats/', views.engine_pool_stats, name='engine_pool_stats'),
+    path('mongo-pool/stats/', views.mongo_pool_stats, name='mongo_pool_stats'),
+    path('admission/stats/', views.admission_stats, name='admission_stats'),
 ]
 
 if settings.DEBUG:
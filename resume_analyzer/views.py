@@ -1,16 +1,34 @@
-from django.shortcuts import render
-
 # Create your views here.
 from django.shortcuts import render, redirect
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
 from django.conf import settings
-from simple_ats.ats import ATS
-import os
 import datetime
+import logging
+from bson.errors import InvalidId
 from bson.objectid import ObjectId
-import fitz  # PyMuPDF
-import io
+from asgiref.sync import sync_to_async
 from django.contrib import messages  # Add this import for flash messages
+from .admission import admission_controlled, get_admission_controller
+from .async_db import get_async_db, get_sync_db, is_asgi
+from .bulk import BulkUploadError, collect_uploads
+from .dedup import find_memoized_result, find_resume_hash_by_file, hash_uploaded_file
+from .engine import get_engine_pool
+from .export import csv_encoder, export_rows, iter_export_rows, iter_stream, ndjson_encoder, stream
+from .extraction import ExtractionLimitExceeded, check_size
+from .jobs import BULK, get_job_status, submit_analysis_job, submit_bulk_job, submit_rescore_job
+from .queries import applicant_filter, applicants_page_pipeline, decode_cursor, encode_cursor
+from .jd_catalog import aget_catalog, ainvalidate_catalog, get_catalog, invalidate_catalog
+from .jd_cache import get_jd_feature_cache, invalidate_job_description, jd_content_hash
+from .ann import get_similarity_index
+from .metrics import render_metrics
+from .mongo import POOL_METRICS
+from .ranking import get_resume_matrix
+from .rescoring import is_current
+from .result_cache import get_analysis_result, invalidate_analysis_results
+from .skills import as_skill_list, parse_skill_query
+
+logger = logging.getLogger(__name__)
 
 # Access the MongoDB connection from settings
 db = settings.DB
@@ -19,7 +37,9 @@ def home(request):
     return render(request, 'resume_analyzer/home.html')
 
 # New view to manage job descriptions
-def manage_job_descriptions(request):
+async def manage_job_descriptions(request):
+    adb = get_async_db(request)
+    
     if request.method == 'POST':
         job_title = request.POST.get('job_title')
         job_description = request.POST.get('job_description')
@@ -28,14 +48,14 @@ def manage_job_descriptions(request):
         if edit_id:  # Editing existing job description
             try:
                 object_id = ObjectId(edit_id)
-                result = db.job_descriptions.update_one(
-                    {'_id': object_id},
-                    {'$set': {
-                        'title': job_title,
-                        'content': job_description,
-                        'updated_at': datetime.datetime.now()
-                    }}
-                )
+                previous = await adb.job_descriptions.find_one({'_id': object_id}, {'content': 1})
+                update = _job_description_update(previous, job_title, job_description)
+                result = await adb.job_descriptions.update_one({'_id': object_id}, update)
+                await sync_to_async(_job_description_changed)(previous)
+                
+                await ainvalidate_catalog()
+                if result.modified_count > 0 and '$inc' in update:
+                    await sync_to_async(submit_rescore_job)(object_id)
                 
                 if result.modified_count > 0:
                     messages.success(request, f"Job description '{job_title}' updated successfully.")
@@ -45,33 +65,50 @@ def manage_job_descriptions(request):
                 messages.error(request, f"Error updating job description: {str(e)}")
         else:  # Adding new job description
             try:
-                jd_id = db.job_descriptions.insert_one({
+                await adb.job_descriptions.insert_one({
                     'title': job_title,
                     'content': job_description,
                     'created_at': datetime.datetime.now()
-                }).inserted_id
+                })
+                await ainvalidate_catalog()
                 messages.success(request, f"Job description '{job_title}' saved successfully.")
             except Exception as e:
                 messages.error(request, f"Error saving job description: {str(e)}")
         
         return redirect('manage_job_descriptions')
     
-    # Get all job descriptions from MongoDB
-    job_descriptions = list(db.job_descriptions.find().sort('created_at', -1))
-    
-    # Convert MongoDB _id to string and add as id attribute
-    for jd in job_descriptions:
-        jd['id'] = str(jd['_id'])
+    # Get all job descriptions from the cached catalog
+    job_descriptions = await aget_catalog(adb, full=True)
     
     return render(request, 'resume_analyzer/manage_job_descriptions.html', {
         'job_descriptions': job_descriptions
     })
 
+def _job_description_changed(previous):
+    # Drop everything cached from the job description once it has been
+    # rewritten; invalidating earlier lets a concurrent request re-cache the old text
+    invalidate_job_description(previous)
+    invalidate_analysis_results()
+
+def _job_description_update(previous, job_title, job_description):
+    update = {'$set': {
+        'title': job_title,
+        'content': job_description,
+        'updated_at': datetime.datetime.now()
+    }}
+    # A new version makes the existing scores stale and gets them rescored
+    if previous is not None and previous.get('content') != job_description:
+        update['$inc'] = {'version': 1}
+    return update
+
 # New view to delete a job description
 def delete_job_description(request, jd_id):
     try:
         object_id = ObjectId(jd_id)
+        previous = db.job_descriptions.find_one({'_id': object_id}, {'content': 1})
         result = db.job_descriptions.delete_one({'_id': object_id})
+        _job_description_changed(previous)
+        invalidate_catalog()
         
         if result.deleted_count > 0:
             messages.success(request, "Job description deleted successfully.")
@@ -83,13 +120,10 @@ def delete_job_description(request, jd_id):
     return redirect('manage_job_descriptions')
 
 # Modified upload_resume view
+@admission_controlled('upload_resume', 'ATS_UPLOAD_MAX_BYTES', backlog=True)
 def upload_resume(request):
     # Get all job descriptions for selection
-    job_descriptions = list(db.job_descriptions.find().sort('created_at', -1))
-    
-    # Convert MongoDB _id to string and add as id attribute
-    for jd in job_descriptions:
-        jd['id'] = str(jd['_id'])
+    job_descriptions = get_catalog()
     
     if len(job_descriptions) == 0:
         messages.warning(request, "No job descriptions available. Please add a job description first.")
@@ -122,89 +156,32 @@ def upload_resume(request):
                     'job_descriptions': job_descriptions
                 })
             
-            file_extension = os.path.splitext(resume_file.name)[1].lower()
-            
-            # Read the file content
-            file_bytes = resume_file.read()
-            
-            # Extract text based on file type
-            if file_extension == '.pdf':
-                # Use PyMuPDF for PDF extraction
-                try:
-                    # Open the PDF from memory buffer
-                    pdf_document = fitz.open(stream=file_bytes, filetype="pdf")
-                    
-                    # Extract text from all pages
-                    resume_content = ""
-                    for page_num in range(len(pdf_document)):
-                        page = pdf_document[page_num]
-                        resume_content += page.get_text()
-                    
-                    pdf_document.close()
-                except Exception as e:
-                    # Fallback to simple decoding if PDF extraction fails
-                    resume_content = file_bytes.decode('utf-8', errors='ignore')
-                    print(f"PDF extraction error: {str(e)}")
-            else:
-                # For non-PDF files, use simple decoding
-                resume_content = file_bytes.decode('utf-8', errors='ignore')
-            
-            # Store resume in MongoDB
-            resume_id = db.resumes.insert_one({
-                'filename': resume_file.name,
-                'content': resume_content,
-                'job_description_id': selected_jd_id,  # Store reference to selected JD
-                'uploaded_at': datetime.datetime.now()
-            }).inserted_id
+            # Reject oversized files before anything is read
+            check_size(resume_file.size)
             
-            # Analyze using ATS with detailed error tracking
-            try:
-                print("Starting ATS analysis...")
-                ats = ATS()
-                
-                print("Loading resume...")
-                ats.load_resume(resume_content)
-                
-                print("Loading job description...")
-                ats.load_job_description(job_description['content'])
-                
-                print("Extracting experience...")
-                experience = ats.extract_experience()
-                
-                print("Cleaning experience...")
-                ats.clean_experience(experience)
-                
-                print("Extracting skills...")
-                skills = " ".join(ats.extract_skills())
-                
-                print("Cleaning skills...")
-                ats.clean_skills(skills)
-                
-                print("Computing similarity score...")
-                similarity_score = ats.compute_similarity()
-                print(f"Analysis complete. Similarity score: {similarity_score}")
-                
-            except Exception as ats_error:
-                print(f"ATS Analysis error: {str(ats_error)}")
-                messages.error(request, f"Error during resume analysis: {str(ats_error)}")
-                return render(request, 'resume_analyzer/upload_resume.html', {
-                    'job_descriptions': job_descriptions
-                })
+            # The same file analyzed against the same JD text is answered instantly
+            file_hash = hash_uploaded_file(resume_file)
+            resume_hash = find_resume_hash_by_file(db, file_hash)
+            if resume_hash is not None:
+                memoized = find_memoized_result(
+                    db, resume_hash, jd_content_hash(job_description['content']), selected_jd_id
+                )
+                if memoized is not None and memoized['job_description_id'] == selected_jd_id:
+                    messages.info(request, "This resume was already analyzed for this job description.")
+                    return redirect('analysis_result', result_id=str(memoized['_id']))
             
-            # Store results in MongoDB
-            result_id = db.analysis_results.insert_one({
-                'resume_id': str(resume_id),
-                'job_description_id': selected_jd_id,
-                'similarity_score': float(similarity_score.item() * 100),
-                'extracted_skills': skills,
-                'extracted_experience': experience,
-                'created_at': datetime.datetime.now()
-            }).inserted_id
+            # Queue extraction and analysis; the browser polls the job for progress
+            job_id = submit_analysis_job(resume_file, jd_object_id, file_hash=file_hash)
             
-            return redirect('analysis_result', result_id=str(result_id))
+            return redirect('analysis_job', job_id=job_id)
             
+        except ExtractionLimitExceeded as e:
+            messages.error(request, str(e))
+            return render(request, 'resume_analyzer/upload_resume.html', {
+                'job_descriptions': job_descriptions
+            })
         except Exception as e:
-            print(f"Resume upload error: {str(e)}")
+            logger.exception("Resume upload error: %s", e)
             messages.error(request, f"Error processing resume: {str(e)}")
             return render(request, 'resume_analyzer/upload_resume.html', {
                 'job_descriptions': job_descriptions
@@ -214,91 +191,293 @@ def upload_resume(request):
         'job_descriptions': job_descriptions
     })
 
+# Bulk upload: many resumes (or a zip archive) scored against one job description
+@admission_controlled('bulk_upload_resumes', 'ATS_BULK_MAX_BYTES', backlog=True)
+def bulk_upload_resumes(request):
+    job_descriptions = get_catalog()
+    
+    if len(job_descriptions) == 0:
+        messages.warning(request, "No job descriptions available. Please add a job description first.")
+        return redirect('manage_job_descriptions')
+    
+    if request.method == 'POST':
+        resume_files = request.FILES.getlist('resume_files')
+        resume_archive = request.FILES.get('resume_archive')
+        selected_jd_id = request.POST.get('job_description')
+        
+        if not resume_files and resume_archive is None:
+            messages.error(request, "Please select resume files or a zip archive.")
+            return render(request, 'resume_analyzer/bulk_upload_resumes.html', {
+                'job_descriptions': job_descriptions
+            })
+        
+        if not selected_jd_id:
+            messages.error(request, "Please select a job description.")
+            return render(request, 'resume_analyzer/bulk_upload_resumes.html', {
+                'job_descriptions': job_descriptions
+            })
+        
+        try:
+            job_description = db.job_descriptions.find_one({'_id': ObjectId(selected_jd_id)})
+            
+            if not job_description:
+                messages.error(request, "Selected job description not found.")
+                return render(request, 'resume_analyzer/bulk_upload_resumes.html', {
+                    'job_descriptions': job_descriptions
+                })
+            
+            # The files are streamed into GridFS and scored on the analysis
+            # workers; the job page shows the summary when done
+            uploads = collect_uploads(resume_files, resume_archive)
+            job_id = submit_bulk_job(uploads, job_description['_id'])
+            if job_id is None:
+                messages.error(request, "No PDF, TXT or DOCX resumes found in the upload.")
+                return render(request, 'resume_analyzer/bulk_upload_resumes.html', {
+                    'job_descriptions': job_descriptions
+                })
+            
+            logger.info("Queued bulk ATS analysis job %s", job_id)
+            return redirect('analysis_job', job_id=job_id)
+            
+        except BulkUploadError as e:
+            messages.error(request, str(e))
+        except Exception as e:
+            logger.exception("Bulk resume upload error: %s", e)
+            messages.error(request, f"Error processing resumes: {str(e)}")
+        
+        return render(request, 'resume_analyzer/bulk_upload_resumes.html', {
+            'job_descriptions': job_descriptions
+        })
+    
+    return render(request, 'resume_analyzer/bulk_upload_resumes.html', {
+        'job_descriptions': job_descriptions
+    })
+
+# Progress page for a queued analysis; polls analysis_job_status
+def analysis_job(request, job_id):
+    try:
+        job = get_job_status(ObjectId(job_id))
+    except Exception as e:
+        messages.error(request, f"Invalid job ID format: {str(e)}")
+        return redirect('upload_resume')
+    
+    if job is None:
+        messages.error(request, f"Analysis job with ID {job_id} not found.")
+        return redirect('upload_resume')
+    
+    if job['status'] == 'completed':
+        if job.get('kind') == BULK:
+            return _bulk_job_result(request, job)
+        return redirect('analysis_result', result_id=job['result_id'])
+    
+    return render(request, 'resume_analyzer/analysis_job.html', {
+        'job': job,
+        'job_id': job_id
+    })
+
+def _bulk_job_result(request, job):
+    job_description = db.job_descriptions.find_one({'_id': job['job_description_id']}, {'title': 1})
+    
+    if job['skipped']:
+        messages.warning(request, f"Skipped {len(job['skipped'])} resume(s) over the extraction limits: {', '.join(job['skipped'])}")
+    
+    return render(request, 'resume_analyzer/bulk_upload_result.html', {
+        'job_description': job_description or {'title': 'a deleted job description'},
+        'results': job['results']
+    })
+
+# JSON status of a queued analysis
+def analysis_job_status(request, job_id):
+    try:
+        job = get_job_status(ObjectId(job_id))
+    except Exception:
+        job = None
+    
+    if job is None:
+        return JsonResponse({'error': 'Job not found.'}, status=404)
+    
+    return JsonResponse({
+        'id': job_id,
+        'filename': job['filename'],
+        'status': job['status'],
+        'stage': job['stage'],
+        'progress': job['progress'],
+        'attempts': job['attempts'],
+        'max_attempts': job['max_attempts'],
+        'error': job['error'],
+        'result_url': _job_result_url(job_id, job)
+    })
+
+def _job_result_url(job_id, job):
+    # A bulk job's summary is rendered by its own job page once it completes
+    if job.get('kind') == BULK:
+        return reverse('analysis_job', args=[job_id]) if job['status'] == 'completed' else None
+    return reverse('analysis_result', args=[job['result_id']]) if job['result_id'] else None
+
 # Remove the old upload_job_description view as it's no longer needed
 # def upload_job_description(request, resume_id):
 #     ... (remove this function)
 
 # Keep the analysis_result view as is
-def analysis_result(request, result_id):
+async def analysis_result(request, result_id):
+    adb = get_async_db(request)
+    
     try:
-        print(f"Attempting to retrieve result with ID: {result_id}")
+        logger.debug("Attempting to retrieve result with ID: %s", result_id)
         # Convert string ID to ObjectId
         try:
             object_id = ObjectId(result_id)
-            print(f"Successfully converted to ObjectId: {object_id}")
+            logger.debug("Successfully converted to ObjectId: %s", object_id)
         except Exception as e:
-            print(f"Failed to convert to ObjectId: {str(e)}")
+            logger.warning("Failed to convert to ObjectId: %s", e)
             messages.error(request, f"Invalid result ID format: {str(e)}")
             return redirect('home')
             
-        # Get result from MongoDB
-        result = db.analysis_results.find_one({'_id': object_id})
-        print(f"Database query result: {result is not None}")
+        # Result, resume and job description in one cached aggregation
+        page = await get_analysis_result(adb, object_id)
+        logger.debug("Database query result: %s", page is not None)
         
-        if result is None:
+        if page is None:
             messages.error(request, f"Analysis result with ID {result_id} not found in database.")
             return redirect('home')
         
-        # Convert string IDs to ObjectId
-        try:
-            resume_id = ObjectId(result['resume_id'])
-            jd_id = ObjectId(result['job_description_id'])
-            print(f"Successfully converted related IDs")
-        except Exception as e:
-            print(f"Failed to convert related IDs: {str(e)}")
-            messages.error(request, f"Error with related document references: {str(e)}")
-            return redirect('home')
-        
-        # Get related resume and job description
-        resume = db.resumes.find_one({'_id': resume_id})
-        job_description = db.job_descriptions.find_one({'_id': jd_id})
-        print(f"Related documents found - Resume: {resume is not None}, Job Description: {job_description is not None}")
-        
-        if resume is None or job_description is None:
+        if page['resume'] is None or page['job_description'] is None:
             messages.error(request, "Could not find related resume or job description.")
             return redirect('home')
         
         context = {
-            'result': result,
-            'resume': resume,
-            'job_description': job_description
+            'result': page['result'],
+            'skills': as_skill_list(page['result'].get('extracted_skills')),
+            'resume': page['resume'],
+            'job_description': page['job_description']
         }
         
         return render(request, 'resume_analyzer/analysis_result.html', context)
     except Exception as e:
-        print(f"Unexpected error in analysis_result view: {str(e)}")
+        logger.exception("Unexpected error in analysis_result view: %s", e)
         messages.error(request, f"Error retrieving analysis result: {str(e)}")
         return redirect('home')
 
 # Add this new view function after the existing ones
-def view_applicants(request):
-    # Get all analysis results sorted by similarity score in descending order
-    analysis_results = list(db.analysis_results.find().sort('similarity_score', -1))
+async def view_applicants(request):
+    adb = get_async_db(request, settings.ATS_MONGO_APPLICANTS_READ_PREFERENCE)
+    
+    # Optional filters: job description, score range, date range, skills and keywords
+    selected_jd_id = request.GET.get('job_description', '')
+    after = decode_cursor(request.GET.get('cursor', ''))
+    page_size = getattr(settings, 'ATS_APPLICANTS_PAGE_SIZE', 50)
+    
+    # One aggregation fetches the page and joins only the displayed resume/JD fields
+    match = _applicant_match(request.GET)
+    cursor = await adb.analysis_results.aggregate(
+        applicants_page_pipeline(match, after=after, limit=page_size + 1)
+    )
+    results = await cursor.to_list(None)
+    
+    has_more = len(results) > page_size
+    results = results[:page_size]
     
-    # Fetch related resume and job description data for each result
     applicants = []
-    for result in analysis_results:
-        try:
-            resume = db.resumes.find_one({'_id': ObjectId(result['resume_id'])})
-            job_desc = db.job_descriptions.find_one({'_id': ObjectId(result['job_description_id'])})  
-            
-            if resume and job_desc:
-                applicants.append({
-                    'id': str(result['_id']),
-                    'filename': resume['filename'],
-                    'job_title': job_desc['title'],
-                    'similarity_score': result['similarity_score'],
-                    'extracted_skills': result['extracted_skills'],
-                    'created_at': result['created_at']
-                })
-        except Exception as e:
-            print(f"Error processing result: {str(e)}")
+    for result in results:
+        # Skip results whose resume or job description has been deleted
+        if 'resume' not in result or 'job_description' not in result:
             continue
+        applicants.append({
+            'id': str(result['_id']),
+            'filename': result['resume']['filename'],
+            'job_title': result['job_description']['title'],
+            'similarity_score': result['similarity_score'],
+            'score_current': is_current(result, result['job_description']),
+            'created_at': result['created_at']
+        })
+    
+    next_query = None
+    if has_more:
+        params = request.GET.copy()
+        params['cursor'] = encode_cursor(results[-1])
+        next_query = params.urlencode()
+    
+    first_query = None
+    if after is not None:
+        params = request.GET.copy()
+        params.pop('cursor', None)
+        first_query = params.urlencode()
+    
+    # Exports cover every page of the current filters
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    export_query = params.urlencode()
+    
+    job_descriptions = await aget_catalog(adb)
     
     return render(request, 'resume_analyzer/view_applicants.html', {
-        'applicants': applicants
+        'applicants': applicants,
+        'job_descriptions': job_descriptions,
+        'selected_jd_id': selected_jd_id,
+        'min_score': request.GET.get('min_score', ''),
+        'max_score': request.GET.get('max_score', ''),
+        'created_from': request.GET.get('created_from', ''),
+        'created_to': request.GET.get('created_to', ''),
+        'skills': request.GET.get('skills', ''),
+        'keywords': request.GET.get('q', ''),
+        'next_query': next_query,
+        'first_query': first_query,
+        'export_query': export_query
     })
 
+EXPORT_FORMATS = {
+    'csv': (csv_encoder, 'text/csv; charset=utf-8'),
+    'ndjson': (ndjson_encoder, 'application/x-ndjson'),
+}
+
+async def export_applicants(request):
+    """
+    Stream every applicant matching the applicant list filters as CSV or
+    NDJSON (``?format=``), without loading them all into memory.
+    """
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}, status=400)
+    encoder, content_type = EXPORT_FORMATS[export_format]
+    
+    match = _applicant_match(request.GET)
+    read_preference_name = settings.ATS_MONGO_APPLICANTS_READ_PREFERENCE
+    if is_asgi(request):
+        chunks = stream(export_rows(get_async_db(request, read_preference_name), match), encoder)
+    else:
+        # WSGI servers would buffer an async iterator in full
+        chunks = iter_stream(iter_export_rows(get_sync_db(read_preference_name), match), encoder)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    filename = f"applicants-{datetime.date.today().isoformat()}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def _applicant_match(params):
+    """The ``$match`` for the applicant list filters in a query string."""
+    created_to = _parse_date(params.get('created_to'))
+    return applicant_filter(
+        params.get('job_description', ''),
+        _parse_float(params.get('min_score')),
+        _parse_float(params.get('max_score')),
+        created_from=_parse_date(params.get('created_from')),
+        # The end date is inclusive
+        created_before=created_to + datetime.timedelta(days=1) if created_to else None,
+        skills=parse_skill_query(params.get('skills')),
+        keywords=params.get('q', '').strip(),
+    )
+
+def _parse_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _parse_date(value):
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+
 # Add this new view function
 def edit_job_description(request, jd_id):
     try:
@@ -308,14 +487,13 @@ def edit_job_description(request, jd_id):
             job_title = request.POST.get('job_title')
             job_description = request.POST.get('job_description')
             
-            result = db.job_descriptions.update_one(
-                {'_id': object_id},
-                {'$set': {
-                    'title': job_title,
-                    'content': job_description,
-                    'updated_at': datetime.datetime.now()
-                }}
-            )
+            previous = db.job_descriptions.find_one({'_id': object_id}, {'content': 1})
+            update = _job_description_update(previous, job_title, job_description)
+            result = db.job_descriptions.update_one({'_id': object_id}, update)
+            _job_description_changed(previous)
+            invalidate_catalog()
+            if result.modified_count > 0 and '$inc' in update:
+                submit_rescore_job(object_id)
             
             if result.modified_count > 0:
                 messages.success(request, f"Job description '{job_title}' updated successfully.")
@@ -327,3 +505,127 @@ def edit_job_description(request, jd_id):
         messages.error(request, f"Error updating job description: {str(e)}")
     
     return redirect('manage_job_descriptions')
+
+# Rank every stored resume against a job description, not just those uploaded for it
+def rank_candidates(request, jd_id):
+    try:
+        job_description = db.job_descriptions.find_one({'_id': ObjectId(jd_id)}, {'title': 1, 'content': 1})
+    except Exception:
+        job_description = None
+    
+    if not job_description:
+        messages.error(request, "Job description not found.")
+        return redirect('manage_job_descriptions')
+    
+    k = _parse_int(request.GET.get('k')) or settings.ATS_RANK_DEFAULT_K
+    k = max(1, min(k, settings.ATS_RANK_MAX_K))
+    
+    try:
+        jd_features = get_jd_feature_cache().get_or_compute(job_description['content'], _compute_jd_features)
+        ranked = get_resume_matrix().rank(jd_features['embedding'], k)
+        
+        # Filenames and any existing analysis against this JD, one query each
+        resume_ids = [resume_id for resume_id, _ in ranked]
+        filenames = {
+            resume['_id']: resume.get('filename')
+            for resume in db.resumes.find({'_id': {'$in': resume_ids}}, {'filename': 1})
+        }
+        result_ids = {
+            result['resume_id']: str(result['_id'])
+            for result in db.analysis_results.find(
+                {'job_description_id': jd_id, 'resume_id': {'$in': [str(i) for i in resume_ids]}},
+                {'resume_id': 1},
+            )
+        }
+        
+        candidates = [
+            {
+                'filename': filenames.get(resume_id, 'Unknown'),
+                'similarity_score': max(similarity, 0.0) * 100,
+                'result_id': result_ids.get(str(resume_id)),
+            }
+            for resume_id, similarity in ranked
+        ]
+    except Exception as e:
+        logger.exception("Ranking error: %s", e)
+        messages.error(request, f"Error ranking candidates: {str(e)}")
+        return redirect('manage_job_descriptions')
+    
+    return render(request, 'resume_analyzer/rank_candidates.html', {
+        'job_description': job_description,
+        'candidates': candidates,
+        'k': k,
+    })
+
+# JSON: the resumes most similar to a resume, an analysis result's resume or a job description
+def similar_candidates(request):
+    n = _parse_int(request.GET.get('n')) or settings.ATS_RANK_DEFAULT_K
+    n = max(1, min(n, settings.ATS_RANK_MAX_K))
+    index = get_similarity_index()
+    
+    try:
+        if request.GET.get('jd'):
+            job_description = db.job_descriptions.find_one({'_id': ObjectId(request.GET['jd'])}, {'content': 1})
+            if not job_description:
+                return JsonResponse({'error': 'Job description not found.'}, status=404)
+            query_embedding = get_jd_feature_cache().get_or_compute(
+                job_description['content'], _compute_jd_features
+            )['embedding']
+            exclude = None
+        elif request.GET.get('result') or request.GET.get('resume'):
+            if request.GET.get('result'):
+                result = db.analysis_results.find_one({'_id': ObjectId(request.GET['result'])}, {'resume_id': 1})
+                if not result:
+                    return JsonResponse({'error': 'Analysis result not found.'}, status=404)
+                exclude = ObjectId(result['resume_id'])
+            else:
+                exclude = ObjectId(request.GET['resume'])
+            query_embedding = index.vector_of(exclude)
+            if query_embedding is None:
+                return JsonResponse({'error': 'Resume not found or not yet embedded.'}, status=404)
+        else:
+            return JsonResponse({'error': 'Pass one of resume, result or jd.'}, status=400)
+    except InvalidId:
+        return JsonResponse({'error': 'Invalid id.'}, status=400)
+    
+    similar = index.search(query_embedding, n, exclude=exclude)
+    filenames = {
+        resume['_id']: resume.get('filename')
+        for resume in db.resumes.find({'_id': {'$in': [resume_id for resume_id, _ in similar]}}, {'filename': 1})
+    }
+    return JsonResponse({
+        'candidates': [
+            {
+                'resume_id': str(resume_id),
+                'filename': filenames.get(resume_id),
+                'similarity': similarity,
+            }
+            for resume_id, similarity in similar
+        ]
+    })
+
+def _compute_jd_features(content):
+    with get_engine_pool().checkout() as engine:
+        return engine.compute_jd_features(content)
+
+def _parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+# Stage timing histograms in the Prometheus text format
+def metrics(request):
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def engine_pool_stats(request):
+    """Occupancy and checkout wait-time metrics for the ATS engine pool."""
+    return JsonResponse(get_engine_pool().stats())
+
+def mongo_pool_stats(request):
+    """Connection counts of this process's MongoDB connection pools."""
+    return JsonResponse({'pools': POOL_METRICS.stats()})
+
+def admission_stats(request):
+    """Upload slots in use, waiting requests and rejections in this process."""
+    return JsonResponse(get_admission_controller().stats())